@@ -1,4 +1,6 @@
 from PIL import Image, ImageDraw
+from overlay import composite_resized
+import metrics
 import os
 
 # Create a new RGBA image with transparency
@@ -11,10 +13,13 @@ draw.rectangle([(100, 100), (300, 200)], fill=(255, 0, 0, 128))
 # Load another image to overlay onto
 background_img = Image.open(os.path.join("img", "pillow-logo-light-text.png"))
 
-# Resize the overlay image to fit the background
-overlay_img = transparent_img.resize(background_img.size, Image.BICUBIC)
-
-# Composite the overlay onto the background
-final_img = Image.alpha_composite(background_img.convert("RGBA"), overlay_img)
+# Stretch the overlay to the background and composite it; only the
+# rectangle's bounding box is resampled and blended
+with metrics.span("alpha.composite") as s:
+    s.image_in(transparent_img)
+    final_img = composite_resized(
+        background_img.convert("RGBA"), transparent_img, Image.BICUBIC
+    )
+    s.image_out(final_img)
 print("Example #37: Writing transparent image!")
 final_img.save(os.path.join("img", "transparent_image.png"))
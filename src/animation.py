@@ -0,0 +1,164 @@
+from PIL import Image, ImageChops, GifImagePlugin
+from itertools import chain, islice
+from quantize import build_palette
+import os
+
+# Frames are quantized to at most 255 colors; index 255 is kept free as the
+# transparent "unchanged" color for delta frames.
+TRANSPARENT = 255
+
+# Options write_gif passes on to the GIF header. Others (optimize, say)
+# would rework the shared palette that delta frames depend on.
+GIF_PARAMS = ("comment", "background")
+
+
+def palette_image(palette):
+    """Accept a "P" image or a flat [r, g, b, ...] list. Only the first 255
+    colors are used."""
+    if isinstance(palette, Image.Image):
+        palette = palette.getpalette("RGB")
+    im = Image.new("P", (1, 1))
+    im.putpalette(list(palette)[: TRANSPARENT * 3])
+    return im
+
+
+def apply_palette(frame, palette, dither=Image.Dither.FLOYDSTEINBERG):
+    # Nearest-color mapping onto a fixed palette: no per-frame median cut.
+    return frame.convert("RGB").quantize(palette=palette, dither=dither)
+
+
+def _durations(duration):
+    # Per-frame durations; a list's last value repeats if it runs short.
+    if isinstance(duration, (list, tuple)):
+        yield from duration
+        duration = duration[-1]
+    while True:
+        yield duration
+
+
+def write_gif(
+    fp,
+    frames,
+    duration=100,
+    loop=0,
+    palette=None,
+    sample=4,
+    dither=Image.Dither.FLOYDSTEINBERG,
+    comment=None,
+    background=None,
+):
+    """Stream frames (any iterable, consumed lazily) to fp as an animated GIF.
+
+    All frames share one global palette, either the one given or one built
+    from the first `sample` frames. After the first frame, only the bounding
+    box of what changed is written, with unchanged pixels inside it made
+    transparent and disposal 1 (leave in place), so static areas cost
+    nothing. Identical consecutive frames are merged into one longer frame;
+    at most two frames are held at a time.
+    """
+    frames = iter(frames)
+    head = list(islice(frames, max(sample, 1)))
+    if not head:
+        raise ValueError("no frames to write")
+    if palette is None:
+        palette = build_palette(head, TRANSPARENT)
+    palette = palette_image(palette)
+    rgb_palette = palette.getpalette("RGB")[: TRANSPARENT * 3]
+    rgb_palette += [0, 0, 0] * (256 - len(rgb_palette) // 3)
+
+    durations = _durations(duration)
+    previous = None
+    pending = None  # (image, offset, duration, transparent)
+
+    def flush(item):
+        im, offset, ms, transparent = item
+        params = {"duration": ms, "disposal": 1}
+        if transparent:
+            params["transparency"] = TRANSPARENT
+        for chunk in GifImagePlugin.getdata(im, offset, **params):
+            fp.write(chunk)
+
+    for frame in chain(head, frames):
+        current = apply_palette(frame, palette, dither)
+        current.putpalette(rgb_palette)
+        ms = next(durations)
+        if previous is None:
+            info = {"loop": loop, "comment": comment}
+            if background is not None:
+                info["background"] = background
+            header, _ = GifImagePlugin.getheader(current, info=info)
+            for chunk in header:
+                fp.write(chunk)
+            pending = (current, (0, 0), ms, False)
+        else:
+            diff = ImageChops.difference(current, previous)
+            bbox = diff.getbbox()
+            if bbox is None:
+                im, offset, pending_ms, transparent = pending
+                pending = (im, offset, pending_ms + ms, transparent)
+                continue
+            flush(pending)
+            delta = current.crop(bbox)
+            changed = diff.crop(bbox)
+            # diff holds palette indices; read them as plain 0..255 values.
+            changed = Image.frombytes("L", changed.size, changed.tobytes())
+            delta.paste(TRANSPARENT, mask=changed.point(lambda v: 255 if v == 0 else 0))
+            pending = (delta, bbox[:2], ms, True)
+        previous = current
+    flush(pending)
+    fp.write(b";")
+
+
+def save_animation(
+    dest,
+    frames,
+    duration=100,
+    loop=0,
+    palette=None,
+    sample=4,
+    format=None,
+    dither=Image.Dither.FLOYDSTEINBERG,
+    **params,
+):
+    """Save frames as an animated GIF, WebP or PNG (APNG).
+
+    The format comes from dest's extension unless given. GIF is streamed by
+    write_gif, which takes the params in GIF_PARAMS and refuses others.
+    Pillow's WebP and APNG writers need every frame up front, so those are
+    collected first and params go to Pillow's save(); libwebp does its own
+    inter-frame diffing, and APNG frames are mapped onto one shared palette
+    before Pillow crops each to its changed region. dither applies to the
+    palette formats, GIF and APNG.
+    """
+    if format is None:
+        format = os.path.splitext(os.fspath(dest))[1].lstrip(".").upper()
+    format = {"APNG": "PNG"}.get(format, format)
+
+    if format == "GIF":
+        unknown = sorted(set(params) - set(GIF_PARAMS))
+        if unknown:
+            raise TypeError(f"unsupported GIF option(s): {', '.join(unknown)}")
+        with open(dest, "wb") as fp:
+            write_gif(fp, frames, duration, loop, palette, sample, dither, **params)
+        return
+
+    frames = iter(frames)
+    if format == "PNG":
+        head = list(islice(frames, max(sample, 1)))
+        pal = (
+            palette_image(palette)
+            if palette is not None
+            else build_palette(head, TRANSPARENT)
+        )
+        frames = [apply_palette(f, pal, dither) for f in chain(head, frames)]
+    else:
+        frames = [f.convert("RGBA") for f in frames]
+    frames[0].save(
+        dest,
+        format,
+        save_all=True,
+        append_images=frames[1:],
+        duration=duration,
+        loop=loop,
+        **params,
+    )
@@ -0,0 +1,84 @@
+from PIL import Image, ImageDraw, ImageFont
+from collections import namedtuple
+from functools import lru_cache
+from gradient import cached_gradient
+
+# Tried in order; the first one FreeType can load wins.
+FONT_CANDIDATES = (
+    "Arial.ttf",  # macos
+    "/usr/share/fonts/liberation-mono/LiberationMono-Regular.ttf",  # linux
+    "DejaVuSans.ttf",
+)
+
+# A place for per-request text: where it goes, how big and what color.
+TextSlot = namedtuple("TextSlot", ["xy", "size", "fill", "fonts", "anchor"])
+TextSlot.__new__.__defaults__ = ("black", FONT_CANDIDATES, None)
+
+
+@lru_cache(maxsize=64)
+def load_font(path, size):
+    """FreeTypeFont for (path, size), loaded once."""
+    return ImageFont.truetype(path, size)
+
+
+@lru_cache(maxsize=64)
+def find_font(size, candidates=FONT_CANDIDATES):
+    """First loadable font from candidates at size.
+
+    Cached on its own so a missing candidate isn't searched for again on
+    every call; falls back to Pillow's built-in font.
+    """
+    for path in candidates:
+        try:
+            return load_font(path, size)
+        except OSError:
+            pass
+    return ImageFont.load_default(size)
+
+
+class BannerTemplate:
+    """A banner whose background and shapes are rendered once.
+
+    background is a color, or ("linear" | "radial", stops, {options}) for a
+    gradient. shapes are (ImageDraw method name, xy, {options}) tuples, drawn
+    in order. slots maps names to TextSlots filled in per render.
+    """
+
+    def __init__(self, size, background="white", shapes=(), slots=None, mode="RGB"):
+        self.size = tuple(size)
+        self.background = background
+        self.shapes = list(shapes)
+        self.slots = dict(slots or {})
+        self.mode = mode
+        self._static = None
+
+    def static_layer(self):
+        if self._static is None:
+            if isinstance(self.background, tuple) and self.background[0] in (
+                "linear",
+                "radial",
+            ):
+                kind, stops, options = (self.background + ({},))[:3]
+                layer = cached_gradient(kind, self.size, stops, self.mode, **options)
+            else:
+                layer = Image.new(self.mode, self.size, self.background)
+            draw = ImageDraw.Draw(layer)
+            for method, xy, options in self.shapes:
+                getattr(draw, method)(xy, **options)
+            self._static = layer
+        return self._static
+
+    def render(self, texts):
+        """Copy the static layer and draw texts ({slot name: text}) on it."""
+        image = self.static_layer().copy()
+        draw = ImageDraw.Draw(image)
+        for name, text in texts.items():
+            slot = self.slots[name]
+            font = find_font(slot.size, tuple(slot.fonts))
+            draw.text(slot.xy, text, font=font, fill=slot.fill, anchor=slot.anchor)
+        return image
+
+    def render_many(self, variants):
+        """Render each {slot name: text} dict in variants, in order."""
+        self.static_layer()
+        return [self.render(texts) for texts in variants]
@@ -1,8 +1,304 @@
 from PIL import Image
+from bufferpool import default_pool
+from bounded import bounded_submit
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from dedupe import drop_duplicate_jobs, hash_files
+import glob
+import manifest
+import metrics
+import multiprocessing
+import os
+import time
 
 
-def compress_image(source_path, dest_path):
-    with Image.open(source_path) as img:
+def compress_image(source_path, dest_path, quality=80, pool=None):
+    if pool is None:
+        with Image.open(source_path) as img:
+            with metrics.span("compress.decode") as s:
+                img.load()
+                s.image_out(img)
+                if metrics.is_enabled():
+                    s.record(bytes_in=os.path.getsize(source_path))
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            with metrics.span("compress.encode") as s:
+                s.image_in(img)
+                img.save(dest_path, "JPEG", optimize=True, quality=quality)
+                if metrics.is_enabled():
+                    s.record(bytes_out=os.path.getsize(dest_path))
+        return
+
+    # Read and encode through pooled buffers, so a worker churning through
+    # thousands of files reuses the same few allocations.
+    with pool.read_file(source_path) as reader, Image.open(reader) as img:
+        with metrics.span("compress.decode") as s:
+            img.load()
+            s.record(bytes_in=len(reader.getbuffer()))
+            s.image_out(img)
         if img.mode != "RGB":
             img = img.convert("RGB")
-        img.save(dest_path, "JPEG", optimize=True, quality=80)
+        with pool.writer(len(reader.getbuffer())) as writer:
+            with metrics.span("compress.encode") as s:
+                s.image_in(img)
+                img.save(writer, "JPEG", optimize=True, quality=quality)
+                s.record(bytes_out=len(writer.getbuffer()))
+            with open(dest_path, "wb") as f:
+                f.write(writer.getbuffer())
+
+
+# One entry per source file. error is None on success, otherwise the repr of
+# the exception raised while compressing that file.
+BatchResult = namedtuple(
+    "BatchResult", ["source", "dest", "bytes_in", "bytes_out", "seconds", "error"]
+)
+
+
+def _compress_job(source_path, dest_path, quality, collect=False):
+    # Runs in the worker process. Never raises, so one bad file can't take
+    # down the rest of the batch. Returns (BatchResult, metrics): with
+    # collect, a pool worker process hands back the metrics it recorded for
+    # the parent to merge; otherwise metrics is None.
+    if collect:
+        metrics.enable()
+    start = time.perf_counter()
+    try:
+        compress_image(source_path, dest_path, quality, default_pool)
+        bytes_in = os.path.getsize(source_path)
+        bytes_out = os.path.getsize(dest_path)
+        error = None
+    except Exception as e:
+        bytes_in = bytes_out = 0
+        error = repr(e)
+    seconds = time.perf_counter() - start
+    result = BatchResult(
+        str(source_path), str(dest_path), bytes_in, bytes_out, seconds, error
+    )
+    # Threads (and inline runs) already record into the parent's metrics.
+    if collect and multiprocessing.parent_process() is not None:
+        return result, metrics.drain()
+    return result, None
+
+
+def _future_result(future, source_path, dest_path):
+    # Pool-level failures (e.g. a worker killed by the OOM killer) surface
+    # here rather than inside _compress_job.
+    try:
+        result, worker_metrics = future.result()
+    except Exception as e:
+        return BatchResult(str(source_path), str(dest_path), 0, 0, 0.0, repr(e))
+    if worker_metrics:
+        metrics.merge(worker_metrics)
+    return result
+
+
+def expand_sources(sources):
+    """Accept a glob pattern or an iterable of paths."""
+    if isinstance(sources, (str, os.PathLike)):
+        return sorted(glob.glob(os.fspath(sources)))
+    return list(sources)
+
+
+def batch_jobs(sources, dest_dir, ext=".jpg"):
+    """Pair each source with its output path in dest_dir."""
+    jobs = []
+    for path in expand_sources(sources):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        jobs.append((path, os.path.join(dest_dir, stem + ext)))
+    return jobs
+
+
+def iter_compress(
+    jobs, workers=None, max_in_flight=None, ordered=True, quality=80, executor=None
+):
+    """Compress (source, dest) jobs on a process pool, yielding BatchResults.
+
+    Jobs are queued through bounded_submit, at most max_in_flight at a
+    time, so huge job lists don't pile up pending futures. With
+    ordered=False results are yielded as soon as each file finishes.
+    executor, if given, is used instead of a new process pool (and left
+    running); a ThreadPoolExecutor works too.
+    """
+    if workers == 1 and executor is None:
+        for source_path, dest_path in jobs:
+            yield _compress_job(source_path, dest_path, quality)[0]
+        return
+
+    calls = ((s, d, quality, metrics.is_enabled()) for s, d in jobs)
+    for (source_path, dest_path, *_), future in bounded_submit(
+        _compress_job,
+        calls,
+        workers,
+        max_in_flight,
+        executor,
+        ProcessPoolExecutor,
+        ordered,
+    ):
+        yield _future_result(future, source_path, dest_path)
+
+
+def summarize(results, seconds):
+    """Throughput summary for a finished batch."""
+    ok = [r for r in results if r.error is None]
+    bytes_in = sum(r.bytes_in for r in ok)
+    bytes_out = sum(r.bytes_out for r in ok)
+    return {
+        "files": len(results),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "seconds": seconds,
+        "files_per_sec": len(ok) / seconds if seconds else 0.0,
+        "mb_per_sec": bytes_in / 1e6 / seconds if seconds else 0.0,
+    }
+
+
+def compress_batch(
+    sources,
+    dest_dir,
+    workers=None,
+    max_in_flight=None,
+    ordered=True,
+    quality=80,
+    callback=None,
+    dedupe=None,
+    executor=None,
+):
+    """Compress a glob or iterable of images into dest_dir as JPEGs.
+
+    callback, if given, is called with each BatchResult as it arrives.
+    workers, max_in_flight and executor are as for iter_compress.
+    dedupe, if given, is a perceptual-hash distance in bits (0-64): a
+    source that close to an earlier one is not encoded at all, and the
+    summary maps it to that source under "duplicate_of".
+    Returns (results, summary).
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    jobs = batch_jobs(sources, dest_dir)
+    duplicate_of = {}
+    if dedupe is not None:
+        jobs, duplicate_of = drop_duplicate_jobs(jobs, dedupe)
+    results = []
+    start = time.perf_counter()
+    for result in iter_compress(
+        jobs, workers, max_in_flight, ordered, quality, executor
+    ):
+        results.append(result)
+        if callback is not None:
+            callback(result)
+    summary = summarize(results, time.perf_counter() - start)
+    if dedupe is not None:
+        summary["duplicates"] = len(duplicate_of)
+        summary["duplicate_of"] = duplicate_of
+    return results, summary
+
+
+def compress_incremental(
+    sources,
+    dest_dir,
+    workers=None,
+    max_in_flight=None,
+    quality=80,
+    manifest_path=None,
+    prune=True,
+    callback=None,
+    dedupe=None,
+    executor=None,
+):
+    """Like compress_batch, but only re-encode sources that changed.
+
+    A manifest in dest_dir records each source's size, mtime and sha256,
+    the encoder settings and the output's hash. Sources whose content and
+    settings match the manifest are skipped; with prune=True, outputs whose
+    source has disappeared are deleted. dedupe works as in compress_batch,
+    with sources encoded on earlier runs counting as originals (their
+    hashes are kept in the manifest); a dropped duplicate's old output is
+    deleted and the manifest remembers it, so later runs skip it without
+    hashing it again. Returns (results, summary) where summary also
+    carries "skipped" and "pruned" counts.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    if manifest_path is None:
+        manifest_path = os.path.join(dest_dir, manifest.MANIFEST_NAME)
+    entries = manifest.load_manifest(manifest_path)
+    settings = {"format": "JPEG", "quality": quality, "optimize": True}
+
+    dedupe_settings = dict(settings, dedupe=dedupe)
+
+    jobs = []
+    current = []
+    duplicate_of = {}
+    for source_path, dest_path in batch_jobs(sources, dest_dir):
+        key = str(source_path)
+        entry = entries.get(key)
+        if manifest.is_current(entry, source_path, dest_path, settings):
+            current.append(key)
+        elif dedupe is not None and manifest.is_current_duplicate(
+            entry, source_path, dedupe_settings
+        ):
+            duplicate_of[key] = entry["duplicate_of"]
+        else:
+            entries.pop(key, None)
+            jobs.append((source_path, dest_path))
+    removed = []
+    hashes = {}
+    if dedupe is not None:
+        # A remembered duplicate is only still one if its original is
+        # unchanged, so recheck it alongside a re-encoded original.
+        queued = {str(source) for source, _ in jobs}
+        for key, original in list(duplicate_of.items()):
+            if original in queued or original not in entries:
+                del duplicate_of[key]
+                jobs.append((key, entries.pop(key)["dest"]))
+        # Sources encoded on earlier runs are originals too. Their hashes
+        # are kept in the manifest, so each is only hashed once.
+        unhashed = [key for key in current if "phash" not in entries[key]]
+        for key, value in hash_files(unhashed):
+            entries[key]["phash"] = value
+        known = [
+            (entries[key]["phash"], key)
+            for key in current
+            if entries[key]["phash"] is not None
+        ]
+        dests = {str(source): dest for source, dest in jobs}
+        jobs, dropped = drop_duplicate_jobs(jobs, dedupe, known=known, hashes=hashes)
+        for key, original in dropped.items():
+            # Its output from before it became a duplicate is now stale.
+            try:
+                os.remove(dests[key])
+                removed.append(str(dests[key]))
+            except FileNotFoundError:
+                pass
+            entries[key] = manifest.make_duplicate_entry(
+                key, dests[key], dedupe_settings, original
+            )
+        duplicate_of.update(dropped)
+
+    results = []
+    start = time.perf_counter()
+    try:
+        for result in iter_compress(
+            jobs, workers, max_in_flight, True, quality, executor
+        ):
+            if result.error is None:
+                entry = manifest.make_entry(result.source, result.dest, settings)
+                if result.source in hashes:
+                    entry["phash"] = hashes[result.source]
+                entries[result.source] = entry
+            results.append(result)
+            if callback is not None:
+                callback(result)
+    finally:
+        # Record whatever finished, even if the run is interrupted.
+        if prune:
+            removed += manifest.prune(entries)
+        manifest.save_manifest(manifest_path, entries)
+
+    summary = summarize(results, time.perf_counter() - start)
+    summary["skipped"] = len(current)
+    summary["pruned"] = len(removed)
+    if dedupe is not None:
+        summary["duplicates"] = len(duplicate_of)
+        summary["duplicate_of"] = duplicate_of
+    return results, summary
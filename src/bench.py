@@ -0,0 +1,456 @@
+# Headless benchmarks for the demo.py examples.
+#
+#     python src/bench.py list
+#     python src/bench.py run --sizes 256,1024 --repeat 5 -o results.json
+#     python src/bench.py run --cases rotate,thumbnail --baseline results.json
+#     python src/bench.py compare baseline.json results.json --threshold 0.1
+#
+# Each case times one example's operation on a synthetic input (hopper
+# scaled to each size) without rich, readline or code.interact. By default
+# every (case, size) runs in a fresh process, so peak RSS is per case.
+
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps, ImageSequence
+from functools import lru_cache
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+CASES = {}
+
+
+def case(name):
+    """Register a benchmark case.
+
+    The decorated function takes (size, workdir), does any setup, and
+    returns the zero-argument callable that gets timed.
+    """
+
+    def register(setup):
+        CASES[name] = setup
+        return setup
+
+    return register
+
+
+@lru_cache(maxsize=8)
+def _source(size):
+    with Image.open(os.path.join("img", "hopper.ppm")) as im:
+        return im.resize((size, size), Image.BICUBIC)
+
+
+def source_image(size):
+    """hopper.ppm scaled to size x size; a fresh copy each call."""
+    return _source(size).copy()
+
+
+def source_file(size, workdir, ext=".jpg"):
+    path = os.path.join(workdir, f"source_{size}{ext}")
+    if not os.path.exists(path):
+        source_image(size).save(path)
+    return path
+
+
+@case("open")
+def _open(size, workdir):
+    path = source_file(size, workdir)
+
+    def run():
+        with Image.open(path) as im:
+            im.load()
+
+    return run
+
+
+@case("save_jpeg")
+def _save_jpeg(size, workdir):
+    im = source_image(size)
+    dest = os.path.join(workdir, "out.jpg")
+    return lambda: im.save(dest, quality=80)
+
+
+@case("rotate")
+def _rotate(size, workdir):
+    im = source_image(size)
+    return lambda: im.rotate(45, expand=True)
+
+
+@case("thumbnail")
+def _thumbnail(size, workdir):
+    from thumbnail import make_thumbnails
+
+    path = source_file(size, workdir)
+    return lambda: make_thumbnails(path, (size // 4, 64))
+
+
+@case("crop_paste")
+def _crop_paste(size, workdir):
+    im = source_image(size)
+    box = (0, 0, size // 2, size // 2)
+
+    def run():
+        region = im.crop(box).transpose(Image.Transpose.ROTATE_180)
+        im.paste(region, box)
+
+    return run
+
+
+@case("roll")
+def _roll(size, workdir):
+    from roll import roll
+
+    im = source_image(size)
+    return lambda: roll(im, size // 3)
+
+
+@case("merge")
+def _merge(size, workdir):
+    from merge import merge_images
+
+    images = [source_image(size), source_image(size // 2)]
+    return lambda: merge_images(images)
+
+
+@case("split_merge")
+def _split_merge(size, workdir):
+    im = source_image(size)
+
+    def run():
+        r, g, b = im.split()
+        Image.merge("RGB", (b, g, r))
+
+    return run
+
+
+@case("resize")
+def _resize(size, workdir):
+    im = source_image(size)
+    return lambda: im.resize((size // 2, size // 3))
+
+
+@case("transpose")
+def _transpose(size, workdir):
+    im = source_image(size)
+    return lambda: im.transpose(Image.Transpose.ROTATE_90)
+
+
+@case("contain_cover_fit_pad")
+def _imageops(size, workdir):
+    im = source_image(size)
+    box = (size // 2, size // 3)
+
+    def run():
+        for fn in (ImageOps.contain, ImageOps.cover, ImageOps.fit, ImageOps.pad):
+            fn(im, box)
+
+    return run
+
+
+@case("convert")
+def _convert(size, workdir):
+    im = source_image(size)
+    return lambda: im.convert("L")
+
+
+@case("filter")
+def _filter(size, workdir):
+    im = source_image(size)
+    return lambda: im.filter(ImageFilter.DETAIL)
+
+
+@case("filter_tiled")
+def _filter_tiled(size, workdir):
+    from tilefilter import filter_tiled
+
+    im = source_image(size)
+    return lambda: filter_tiled(im, ImageFilter.DETAIL)
+
+
+@case("enhance")
+def _enhance(size, workdir):
+    im = source_image(size)
+    return lambda: ImageEnhance.Contrast(im).enhance(1.3)
+
+
+@case("point")
+def _point(size, workdir):
+    im = source_image(size)
+    return lambda: im.point(lambda i: i * 20)
+
+
+@case("bands")
+def _bands(size, workdir):
+    from pointops import G, PointProgram, R, where
+
+    im = source_image(size)
+    program = PointProgram({"G": where(R < 100, G * 0.7, G)})
+    return lambda: program.apply(im)
+
+
+@case("pipeline")
+def _pipeline(size, workdir):
+    from pipeline import Pipeline
+
+    im = source_image(size)
+    pipeline = (
+        Pipeline(im)
+        .resize((size // 2, size // 2))
+        .crop((0, 0, size // 4, size // 4))
+        .convert("L")
+    )
+    return pipeline.run
+
+
+@case("sequence")
+def _sequence(size, workdir):
+    from frames import iter_frames
+
+    path = os.path.join(workdir, f"frames_{size}.gif")
+    im = source_image(size)
+    frames = [im.rotate(angle) for angle in range(0, 360, 45)]
+    frames[0].save(path, save_all=True, append_images=frames[1:])
+
+    def run():
+        with Image.open(path) as im:
+            for frame in ImageSequence.Iterator(im):
+                frame.load()
+        for _ in iter_frames(path):
+            pass
+
+    return run
+
+
+@case("animation")
+def _animation(size, workdir):
+    from animation import save_animation
+
+    im = source_image(size)
+    frames = [im.rotate(angle) for angle in range(0, 360, 45)]
+    dest = os.path.join(workdir, "out.gif")
+    return lambda: save_animation(dest, frames, duration=100)
+
+
+@case("buffer")
+def _buffer(size, workdir):
+    from buffer import read_image_from_buffer, read_image_to_buffer
+
+    path = source_file(size, workdir, ".png")
+    return lambda: read_image_from_buffer(read_image_to_buffer(path)).load()
+
+
+@case("batch")
+def _batch(size, workdir):
+    from batch import compress_batch
+
+    sources = [source_file(size, workdir, f".{i}.png") for i in range(8)]
+    dest = os.path.join(workdir, "batch")
+    return lambda: compress_batch(sources, dest, workers=2)
+
+
+@case("palette")
+def _palette(size, workdir):
+    im = source_image(size)
+
+    def run():
+        p = im.convert("P", palette=Image.ADAPTIVE, colors=256)
+        p.putpalette(bytes(range(256)) * 3)
+
+    return run
+
+
+@case("alpha")
+def _alpha(size, workdir):
+    background = source_image(size).convert("RGBA")
+    overlay = Image.new("RGBA", (size // 2, size // 2), (255, 0, 0, 128))
+    overlay = overlay.resize(background.size, Image.BICUBIC)
+    return lambda: Image.alpha_composite(background, overlay)
+
+
+def _stats(samples):
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+    }
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_case(name, size, repeat=5, warmup=1):
+    """Time one case at one size in this process; returns a result dict.
+
+    cpu includes worker processes the case started and waited for.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        fn = CASES[name](size, workdir)
+        for _ in range(warmup):
+            fn()
+        wall, cpu = [], []
+        for _ in range(repeat):
+            start_cpu = time.process_time() + _children_cpu()
+            start = time.perf_counter()
+            fn()
+            wall.append(time.perf_counter() - start)
+            cpu.append(time.process_time() + _children_cpu() - start_cpu)
+    # ru_maxrss is in KiB on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+    return {
+        "case": name,
+        "size": size,
+        "repeat": repeat,
+        "warmup": warmup,
+        "wall": _stats(wall),
+        "cpu": _stats(cpu),
+        "peak_rss_mb": round(peak_mb, 1),
+    }
+
+
+def _isolated(conn, name, size, repeat, warmup):
+    try:
+        conn.send(run_case(name, size, repeat, warmup))
+    except Exception as e:
+        conn.send({"case": name, "size": size, "error": repr(e)})
+    finally:
+        conn.close()
+
+
+def run_isolated(name, size, repeat=5, warmup=1):
+    """run_case in a fresh spawned process, so peak RSS is this case's."""
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_isolated, args=(child, name, size, repeat, warmup))
+    process.start()
+    child.close()
+    try:
+        return parent.recv()
+    except EOFError:
+        return {"case": name, "size": size, "error": "worker died"}
+    finally:
+        process.join()
+
+
+def run(cases=None, sizes=(256, 1024), repeat=5, warmup=1, isolate=True, echo=None):
+    """Run cases (default: all) at each size; returns the JSON document."""
+    results = []
+    for name in cases or CASES:
+        if name not in CASES:
+            raise ValueError(f"unknown case {name!r}")
+        for size in sizes:
+            runner = run_isolated if isolate else run_case
+            result = runner(name, size, repeat, warmup)
+            results.append(result)
+            if echo is not None:
+                echo(result)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pillow": Image.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=0.10, stat="median"):
+    """Rows of (case, size, baseline s, current s, ratio, regressed).
+
+    A case regressed when its wall time grew by more than threshold.
+    Cases missing from either side are skipped.
+    """
+    before = {
+        (r["case"], r["size"]): r["wall"][stat]
+        for r in baseline["results"]
+        if "error" not in r
+    }
+    rows = []
+    for r in current["results"]:
+        key = (r["case"], r["size"])
+        if "error" in r or key not in before:
+            continue
+        ratio = r["wall"][stat] / before[key] if before[key] else float("inf")
+        rows.append((*key, before[key], r["wall"][stat], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def format_result(r):
+    if "error" in r:
+        return f"{r['case']:>22} {r['size']:>6}  error: {r['error']}"
+    wall, cpu = r["wall"]["median"] * 1000, r["cpu"]["median"] * 1000
+    return (
+        f"{r['case']:>22} {r['size']:>6} {wall:10.2f} ms {cpu:10.2f} ms cpu"
+        f" {r['peak_rss_mb']:8.1f} MB"
+    )
+
+
+def print_comparison(rows):
+    for name, size, before, after, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(
+            f"{name:>22} {size:>6} {before * 1000:10.2f} -> {after * 1000:10.2f} ms"
+            f" ({ratio:5.2f}x){flag}"
+        )
+    return sum(row[-1] for row in rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the demo examples.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list")
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--cases", help="comma-separated case names")
+    run_parser.add_argument("--sizes", default="256,1024")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--warmup", type=int, default=1)
+    run_parser.add_argument("--no-isolate", action="store_true")
+    run_parser.add_argument("-o", "--output")
+    run_parser.add_argument("--baseline")
+    run_parser.add_argument("--threshold", type=float, default=0.10)
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        print("\n".join(CASES))
+        return 0
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        return 1 if print_comparison(compare(baseline, current, args.threshold)) else 0
+
+    document = run(
+        args.cases.split(",") if args.cases else None,
+        [int(s) for s in args.sizes.split(",")],
+        args.repeat,
+        args.warmup,
+        not args.no_isolate,
+        echo=lambda r: print(format_result(r), flush=True),
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        return 1 if print_comparison(compare(baseline, document, args.threshold)) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+from PIL import Image, ImageChops
+from roll import np, roll
+import timeit
+
+# Compare roll() backends against ImageChops.offset, which allocates a new
+# image, across a range of panorama-ish sizes.
+sizes = [(512, 256), (2048, 1024), (8192, 2048), (16384, 4096)]
+repeat = 5
+
+
+def best(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+print(
+    f"{'size':>12} {'pillow':>10} {'numpy':>10} {'offset':>10}  (ms, best of {repeat})"
+)
+for size in sizes:
+    im = Image.linear_gradient("L").resize(size).convert("RGB")
+    delta = size[0] // 3
+    number = max(1, 2_000_000 // (size[0] * size[1]))
+
+    pillow = best(lambda: roll(im, delta, backend="pillow"), number)
+    numpy = best(lambda: roll(im, delta, backend="numpy"), number) if np else None
+    offset = best(lambda: ImageChops.offset(im, -delta, 0), number)
+
+    numpy = f"{numpy * 1000:10.2f}" if numpy is not None else f"{'n/a':>10}"
+    label = f"{size[0]}x{size[1]}"
+    print(f"{label:>12} {pillow * 1000:10.2f} {numpy} {offset * 1000:10.2f}")
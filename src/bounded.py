@@ -0,0 +1,61 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import os
+
+
+def default_max_pending(workers=None):
+    """Twice workers, which defaults to the CPU count."""
+    return (workers or os.cpu_count() or 1) * 2
+
+
+def bounded_submit(
+    fn,
+    calls,
+    workers=None,
+    max_pending=None,
+    executor=None,
+    executor_class=ThreadPoolExecutor,
+    ordered=True,
+):
+    """Run fn(*args) for each args in calls, yielding (args, future) pairs.
+
+    Futures come back finished, in submission order (or as they complete,
+    with ordered=False). calls is consumed lazily and at most max_pending
+    (default: default_max_pending(workers)) futures are outstanding at
+    once, so long inputs and big results never pile up. Without an
+    executor, an executor_class(max_workers=workers) is made for the run
+    and shut down at the end; a given executor is left running, though
+    whatever is still queued on it is cancelled if the caller stops early.
+    """
+    if max_pending is None:
+        max_pending = default_max_pending(workers)
+    own_executor = executor is None
+    if own_executor:
+        executor = executor_class(max_workers=workers)
+    calls = iter(calls)
+    pending = deque()
+
+    def submit_next():
+        for args in calls:
+            pending.append((args, executor.submit(fn, *args)))
+            return True
+        return False
+
+    try:
+        while len(pending) < max_pending and submit_next():
+            pass
+        while pending:
+            if ordered:
+                item = pending.popleft()
+                wait([item[1]])
+            else:
+                done, _ = wait([f for _, f in pending], return_when=FIRST_COMPLETED)
+                item = next(p for p in pending if p[1] in done)
+                pending.remove(item)
+            submit_next()
+            yield item
+    finally:
+        for _, future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
@@ -1,14 +1,184 @@
 import io
+import metrics
+import mmap
 from PIL import Image
 
 
-# Function to read an image file into a buffer
-def read_image_to_buffer(image_path):
-    with open(image_path, "rb") as f:
-        image_data = f.read()
-    return io.BytesIO(image_data)
+# Function to read an image file into a buffer (memory-mapped, not copied,
+# unless a BufferPool is given to read into)
+def read_image_to_buffer(image_path, pool=None):
+    if pool is not None:
+        return pool.read_file(image_path)
+    with metrics.span("buffer.read") as s:
+        reader = map_image_file(image_path)
+        s.record(bytes_in=len(reader.getbuffer()))
+    return reader
 
 
 # Function to read an image from a buffer
 def read_image_from_buffer(buffer):
     return Image.open(buffer)
+
+
+class MemoryReader(io.RawIOBase):
+    """Seekable read-only file object over any buffer, without copying it.
+
+    BytesIO copies anything that isn't already a bytes object; this reads
+    straight out of a memoryview, so an mmap'd file or a slice of a larger
+    buffer can be handed to Image.open as-is.
+    """
+
+    def __init__(self, data, on_close=None):
+        self._on_close = on_close
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self._view) + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError(f"negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        chunk = self._view[self._pos : self._pos + len(b)]
+        n = len(chunk)
+        memoryview(b).cast("B")[:n] = chunk
+        self._pos += n
+        return n
+
+    def read(self, size=-1):
+        # Pillow's decoders want bytes, so this is the one place data gets
+        # copied: just the chunk asked for, never the whole buffer.
+        end = len(self._view) if size is None or size < 0 else self._pos + size
+        chunk = self._view[self._pos : end].tobytes()
+        self._pos += len(chunk)
+        return chunk
+
+    def getbuffer(self):
+        return self._view
+
+    def close(self):
+        if not self.closed:
+            # Either step fails if someone still holds a view from
+            # getbuffer(); the memory is then freed once they drop it.
+            try:
+                self._view.release()
+            except BufferError:
+                pass
+            if self._on_close is not None:
+                try:
+                    self._on_close()
+                except BufferError:
+                    pass
+        super().close()
+
+
+def map_image_file(image_path):
+    """Map a file into memory and return a MemoryReader over it.
+
+    Pages are faulted in as the decoder reads them and shared with the page
+    cache, so the file is never duplicated in the process heap.
+    """
+    with open(image_path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return MemoryReader(mapped, on_close=mapped.close)
+
+
+def open_image_mapped(image_path):
+    return Image.open(map_image_file(image_path))
+
+
+def open_image_from_bytes(data):
+    """Open bytes, bytearray, memoryview or mmap data without copying it."""
+    return Image.open(MemoryReader(data))
+
+
+class BufferWriter(io.RawIOBase):
+    """Seekable writer into a caller-supplied or pre-sized bytearray.
+
+    Grows geometrically if the estimate was too small. getbuffer() returns a
+    memoryview of just the written bytes, so encoded output can be sent or
+    written to disk without a final copy.
+    """
+
+    def __init__(self, size_hint=0, buffer=None):
+        self._buf = buffer if buffer is not None else bytearray(size_hint)
+        self._pos = 0
+        self._len = 0
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._len + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError(f"negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def write(self, b):
+        data = memoryview(b).cast("B")
+        end = self._pos + len(data)
+        if end > len(self._buf):
+            self._buf.extend(bytes(max(end, len(self._buf) * 2) - len(self._buf)))
+        self._buf[self._pos : end] = data
+        self._pos = end
+        self._len = max(self._len, end)
+        return len(data)
+
+    def truncate(self, size=None):
+        self._len = self._pos if size is None else size
+        return self._len
+
+    def getbuffer(self):
+        return memoryview(self._buf)[: self._len]
+
+    def getvalue(self):
+        return bytes(self.getbuffer())
+
+
+def encoded_size_hint(im):
+    # Uncompressed size is a safe upper bound for nearly every codec.
+    return im.width * im.height * len(im.getbands()) + 4096
+
+
+def save_image_to_buffer(im, format, size_hint=None, **params):
+    """Encode im into a pre-sized BufferWriter and return the writer."""
+    if size_hint is None:
+        size_hint = encoded_size_hint(im)
+    with metrics.span("buffer.encode") as s:
+        s.image_in(im)
+        writer = BufferWriter(size_hint)
+        im.save(writer, format, **params)
+        s.record(bytes_out=writer.tell())
+    return writer
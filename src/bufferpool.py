@@ -0,0 +1,146 @@
+from buffer import BufferWriter, MemoryReader
+from contextlib import contextmanager
+import os
+import threading
+
+
+def _bucket(size, min_size):
+    # Round up to a power of two, so a buffer can serve any request in
+    # [bucket/2, bucket].
+    return max(min_size, 1 << max(size - 1, 0).bit_length())
+
+
+class BufferPool:
+    """Size-bucketed pool of reusable bytearrays.
+
+    checkout() hands out a bytearray at least as long as requested;
+    release() gives it back. buffer(), writer() and read_file() wrap the
+    same thing as context managers. Buffers that are still exported (a live
+    memoryview) when released are dropped rather than reused.
+    """
+
+    def __init__(self, min_size=64 * 1024, max_per_bucket=8, max_idle_bytes=256 << 20):
+        self.min_size = min_size
+        self.max_per_bucket = max_per_bucket
+        self.max_idle_bytes = max_idle_bytes
+        self._free = {}
+        self._leased = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.returned = 0
+        self.discarded = 0
+        self.in_use = 0
+        self.in_use_bytes = 0
+        self.idle_bytes = 0
+        self.high_water_bytes = 0
+
+    def checkout(self, size):
+        bucket = _bucket(size, self.min_size)
+        with self._lock:
+            free = self._free.get(bucket)
+            if free:
+                buf = free.pop()
+                self.idle_bytes -= bucket
+                self.hits += 1
+            else:
+                buf = None
+                self.misses += 1
+            self.in_use += 1
+            self.in_use_bytes += bucket
+            self.high_water_bytes = max(self.high_water_bytes, self.in_use_bytes)
+        if buf is None:
+            buf = bytearray(bucket)
+        with self._lock:
+            self._leased[id(buf)] = bucket
+        return buf
+
+    def release(self, buf):
+        # A writer may have grown buf past its bucket; size accounting and
+        # reuse go by the largest power of two it still covers.
+        bucket = 1 << (len(buf).bit_length() - 1) if buf else 0
+        try:
+            # Resizing fails while a memoryview is still exported, which is
+            # exactly the case where reusing the buffer would be unsafe.
+            buf.append(0)
+            del buf[bucket:]
+            reusable = bucket >= self.min_size
+        except BufferError:
+            reusable = False
+        with self._lock:
+            self.in_use -= 1
+            self.in_use_bytes -= self._leased.pop(id(buf))
+            free = self._free.setdefault(bucket, [])
+            if (
+                reusable
+                and len(free) < self.max_per_bucket
+                and self.idle_bytes + bucket <= self.max_idle_bytes
+            ):
+                free.append(buf)
+                self.idle_bytes += bucket
+                self.returned += 1
+            else:
+                self.discarded += 1
+
+    @contextmanager
+    def buffer(self, size):
+        buf = self.checkout(size)
+        try:
+            yield buf
+        finally:
+            self.release(buf)
+
+    @contextmanager
+    def writer(self, size_hint=0):
+        """BufferWriter over a pooled bytearray.
+
+        Consume writer.getbuffer() inside the block and drop the view before
+        leaving it.
+        """
+        buf = self.checkout(size_hint)
+        try:
+            yield BufferWriter(buffer=buf)
+        finally:
+            self.release(buf)
+
+    def read_file(self, path):
+        """Read a file into a pooled buffer; closing the reader returns it."""
+        size = os.path.getsize(path)
+        buf = self.checkout(size)
+        view = memoryview(buf)
+        try:
+            with open(path, "rb") as f:
+                n = f.readinto(view[:size])
+        except BaseException:
+            view.release()
+            self.release(buf)
+            raise
+
+        def give_back():
+            try:
+                view.release()
+            except BufferError:
+                pass
+            self.release(buf)
+
+        return MemoryReader(view[:n], on_close=give_back)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "returned": self.returned,
+                "discarded": self.discarded,
+                "in_use": self.in_use,
+                "in_use_bytes": self.in_use_bytes,
+                "idle_bytes": self.idle_bytes,
+                "high_water_bytes": self.high_water_bytes,
+                "buckets": {b: len(f) for b, f in sorted(self._free.items()) if f},
+            }
+
+
+# Process-wide pool, shared by the buffer helpers and the batch workers.
+default_pool = BufferPool()
@@ -1,46 +1,53 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageFont
+from overlay import Overlay
 import os
 
-# Create a new image with white background
 width, height = 400, 300
-image = Image.new("RGB", (width, height), "white")
-draw = ImageDraw.Draw(image)
-
-# Draw a red rectangle at the top-left corner
-draw.rectangle([10, 10, 110, 60], outline="red", width=3)
-
-# Draw a green ellipse at the center
-draw.ellipse(
-    [width // 2 - 50, height // 2 - 50, width // 2 + 50, height // 2 + 50],
-    outline="green",
-    width=3,
-)
-
-# Draw a blue line across the image
-draw.line([0, 0, width, height], fill="blue", width=3)
-
-# Draw a small black circle at (300, 200)
-draw.ellipse([295, 195, 305, 205], fill="black")
 
 # Annotate the shapes with their coordinates
 font = ImageFont.load_default()
 
-# Top-left rectangle coordinates
-draw.text((10, 65), "(10, 10) to (110, 60)", fill="red", font=font)
-
-# Center ellipse coordinates
-draw.text(
-    (width // 2 - 50, height // 2 + 55),
-    f"({width//2 - 50}, {height//2 - 50}) to ({width//2 + 50}, {height//2 + 50})",
-    fill="green",
-    font=font,
+# The coordinate system drawing as an overlay spec: each entry is an
+# ImageDraw method, its arguments and its options. It is drawn once, then
+# stamped onto as many images as needed.
+coordinate_system = Overlay(
+    [
+        # Red rectangle at the top-left corner
+        ("rectangle", [10, 10, 110, 60], {"outline": "red", "width": 3}),
+        # Green ellipse at the center
+        (
+            "ellipse",
+            [width // 2 - 50, height // 2 - 50, width // 2 + 50, height // 2 + 50],
+            {"outline": "green", "width": 3},
+        ),
+        # Blue line across the image
+        ("line", [0, 0, width, height], {"fill": "blue", "width": 3}),
+        # Small black circle at (300, 200)
+        ("ellipse", [295, 195, 305, 205], {"fill": "black"}),
+        # Top-left rectangle coordinates
+        ("text", (10, 65), "(10, 10) to (110, 60)", {"fill": "red", "font": font}),
+        # Center ellipse coordinates
+        (
+            "text",
+            (width // 2 - 50, height // 2 + 55),
+            f"({width//2 - 50}, {height//2 - 50}) to ({width//2 + 50}, {height//2 + 50})",
+            {"fill": "green", "font": font},
+        ),
+        # Line coordinates
+        (
+            "text",
+            (width - 100, height - 15),
+            "(0, 0) to (400, 300)",
+            {"fill": "blue", "font": font},
+        ),
+        # Small circle coordinates
+        ("text", (310, 200), "(300, 200)", {"fill": "black", "font": font}),
+    ],
+    (width, height),
 )
 
-# Line coordinates
-draw.text((width - 100, height - 15), "(0, 0) to (400, 300)", fill="blue", font=font)
-
-# Small circle coordinates
-draw.text((310, 200), "(300, 200)", fill="black", font=font)
+# Create a new image with white background and stamp the overlay on it
+image = coordinate_system.apply(Image.new("RGB", (width, height), "white"))
 
 # Save and display the image
 print("Example #34: Writing coordinate_system_example.png!")
@@ -0,0 +1,262 @@
+from PIL import Image
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import json
+import math
+import os
+
+HASH_KINDS = ("ahash", "dhash", "phash")
+
+# Grid each kind samples the image down to before comparing pixels.
+GRID = {"ahash": (8, 8), "dhash": (9, 8), "phash": (32, 32)}
+
+
+def _pack(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bool(bit)
+    return value
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def _grey_thumbnail(im, size):
+    if im.mode not in ("L", "LA", "RGB", "RGBA"):
+        im = im.convert("RGBA" if "transparency" in im.info else "RGB")
+    return im.resize(size, Image.BOX, reducing_gap=2.0).convert("L")
+
+
+def _dct_rows(n, k):
+    # First k rows of the n-point DCT-II matrix.
+    return [
+        [math.cos(math.pi * (2 * x + 1) * u / (2 * n)) for x in range(n)]
+        for u in range(k)
+    ]
+
+
+_DCT = _dct_rows(32, 8)
+
+
+def image_hash(source, kind="phash"):
+    """64-bit perceptual hash of an image or image path.
+
+    ahash: pixels above the mean of an 8x8 grey thumbnail.
+    dhash: whether each pixel of a 9x8 thumbnail is brighter than its
+      right-hand neighbour; robust to brightness and contrast changes.
+    phash: low-frequency DCT coefficients of a 32x32 thumbnail above
+      their median; the most robust to rescaling and recompression.
+    """
+    if kind not in GRID:
+        raise ValueError(f"kind must be one of {HASH_KINDS}")
+    if isinstance(source, (str, os.PathLike)):
+        with Image.open(source) as im:
+            # The source is only needed at a few times the grid size, so
+            # let JPEG decode at 1/2..1/8 scale. Not done to a caller's
+            # image, whose mode and size draft() would change.
+            w, h = GRID[kind]
+            im.draft("L", (w * 4, h * 4))
+            thumb = _grey_thumbnail(im, GRID[kind])
+    else:
+        thumb = _grey_thumbnail(source, GRID[kind])
+    px = list(thumb.getdata())
+
+    if kind == "ahash":
+        mean = sum(px) / len(px)
+        return _pack(p > mean for p in px)
+    if kind == "dhash":
+        return _pack(
+            px[y * 9 + x] > px[y * 9 + x + 1] for y in range(8) for x in range(8)
+        )
+    # 2D DCT restricted to the 8x8 lowest frequencies: rows, then columns.
+    rows = [px[y * 32 : y * 32 + 32] for y in range(32)]
+    partial = [
+        [sum(c * v for c, v in zip(basis, row)) for basis in _DCT] for row in rows
+    ]
+    coeffs = [
+        sum(_DCT[u][y] * partial[y][v] for y in range(32))
+        for u in range(8)
+        for v in range(8)
+    ]
+    # The DC term only measures overall brightness; leave it out of the
+    # median.
+    median = sorted(coeffs[1:])[31]
+    return _pack(c > median for c in coeffs)
+
+
+def _safe_hash(path, kind):
+    try:
+        return image_hash(path, kind)
+    except Exception:
+        return None
+
+
+def hash_files(paths, kind="phash", workers=None):
+    """Yield (path, hash) for each path, hashing on a thread pool.
+
+    hash is None for files that can't be read.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from zip(paths, executor.map(lambda p: _safe_hash(p, kind), paths))
+
+
+class BKTree:
+    """Metric tree over 64-bit hashes under Hamming distance.
+
+    A search with radius r only descends into children whose edge
+    distance is within r of the query's distance to the node, so lookups
+    touch a small part of the tree instead of every hash.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = (value, [item], {})
+                return
+            node = child
+
+    def search(self, value, radius):
+        """[(distance, item), ...] for items within radius of value."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= radius:
+                found.extend((d, item) for item in node[1])
+            for edge, child in node[2].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        found.sort(key=lambda f: f[0])
+        return found
+
+    def __len__(self):
+        return self.size
+
+
+class HashIndex:
+    """Perceptual hashes for a set of files, kept as a packed uint64 array.
+
+    index i of paths goes with hashes[i]; the BK-tree holds indices, so
+    near() is a tree search rather than a scan over every pair.
+    """
+
+    def __init__(self, kind="phash"):
+        self.kind = kind
+        self.paths = []
+        self.hashes = array("Q")
+        self.tree = BKTree()
+
+    def add(self, path, value):
+        self.tree.add(value, len(self.paths))
+        self.paths.append(str(path))
+        self.hashes.append(value)
+
+    def update(self, paths, workers=None):
+        """Hash and add paths; returns the ones that couldn't be read."""
+        failed = []
+        for path, value in hash_files(list(paths), self.kind, workers):
+            if value is None:
+                failed.append(path)
+            else:
+                self.add(path, value)
+        return failed
+
+    def near(self, value, max_distance=5):
+        """[(distance, path), ...] within max_distance bits of value."""
+        return [(d, self.paths[i]) for d, i in self.tree.search(value, max_distance)]
+
+    def groups(self, max_distance=5):
+        """Clusters (lists of paths, in insertion order) of near-duplicates.
+
+        Near-duplicate pairs are joined transitively; files with no close
+        match are left out.
+        """
+        parent = list(range(len(self.paths)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, value in enumerate(self.hashes):
+            for _, j in self.tree.search(value, max_distance):
+                if j > i:
+                    parent[find(j)] = find(i)
+
+        clusters = {}
+        for i in range(len(self.paths)):
+            clusters.setdefault(find(i), []).append(self.paths[i])
+        return [paths for paths in clusters.values() if len(paths) > 1]
+
+    def save(self, path):
+        data = {
+            "kind": self.kind,
+            "paths": self.paths,
+            "hashes": base64.b64encode(self.hashes.tobytes()).decode("ascii"),
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        index = cls(data["kind"])
+        hashes = array("Q")
+        hashes.frombytes(base64.b64decode(data["hashes"]))
+        for p, value in zip(data["paths"], hashes):
+            index.add(p, value)
+        return index
+
+
+def drop_duplicate_jobs(
+    jobs, max_distance=5, kind="phash", workers=None, known=(), hashes=None
+):
+    """Split (source, dest) jobs into unique ones and near-duplicates.
+
+    Sources are hashed, then walked in order: each one within
+    max_distance bits of an earlier kept source, or of a (hash, source)
+    pair in known, is dropped. hashes, if given, is a dict of hashes by
+    source path that is used instead of re-reading those files, and gets
+    the new ones added. Returns (kept_jobs, {dropped source: the kept
+    source it duplicates}). Sources that can't be hashed are always kept.
+    """
+    jobs = list(jobs)
+    if hashes is None:
+        hashes = {}
+    missing = [str(source) for source, _ in jobs if str(source) not in hashes]
+    hashes.update(hash_files(missing, kind, workers))
+    tree = BKTree()
+    for value, source in known:
+        tree.add(value, source)
+    kept, duplicate_of = [], {}
+    for source, dest in jobs:
+        value = hashes[str(source)]
+        if value is not None:
+            match = tree.search(value, max_distance)
+            if match:
+                duplicate_of[str(source)] = str(match[0][1])
+                continue
+            tree.add(value, source)
+        kept.append((source, dest))
+    return kept, duplicate_of
@@ -3,9 +3,16 @@ import code
 from rich.console import Console
 from rich.rule import Rule
 from merge import merge
+from metaindex import MetadataIndex
 from roll import roll
-from batch import compress_image
+from batch import compress_batch, compress_image
 from buffer import read_image_from_buffer, read_image_to_buffer
+from concurrent.futures import ThreadPoolExecutor
+from derived import DerivedCache
+from frames import export_frames
+from pipeline import Pipeline
+from pointops import PointProgram, R, G, where
+from tilefilter import enhance_tiled, filter_tiled
 from pathlib import Path
 from pprint import pprint
 import glob
@@ -152,6 +159,38 @@ print("Example #10: Saved resized hopper!")
 console.print(Rule())
 code.interact(local=globals(), readfunc=readfunc, banner=banner)
 
+# ===============================================================================
+# Example #10 Crop, resize and flip as one planned pipeline
+# ===============================================================================
+console.print(Rule("[bold magenta]Example #10 (pipeline)[/bold magenta]"))
+pipeline = (
+    Pipeline(os.path.join("img", "hopper.ppm"))
+    .resize([64, 64])
+    .transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    .crop((8, 8, 56, 56))
+    .transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+)
+# the crop folds into the resize and the two flips cancel out
+pprint(pipeline.steps())
+pipeline.save(os.path.join("img", "pipeline_hopper.jpg"))
+print("Example #10: Saved resized hopper with a pipeline!")
+console.print(Rule())
+code.interact(local=globals(), readfunc=readfunc, banner=banner)
+
+# ===============================================================================
+# Example #10 Resize through the derived-image cache
+# ===============================================================================
+console.print(Rule("[bold magenta]Example #10 (cached)[/bold magenta]"))
+cache = DerivedCache()
+for attempt in range(3):
+    data = cache.pipeline(pipeline, "JPEG", quality=80)
+with open(os.path.join("img", "cached_hopper.jpg"), "wb") as f:
+    f.write(data)
+# the first call renders; the others are cache hits
+pprint(cache.info())
+console.print(Rule())
+code.interact(local=globals(), readfunc=readfunc, banner=banner)
+
 # ===============================================================================
 # Example #11 Transpose image left to right
 # https://pillow.readthedocs.io/en/stable/handbook/tutorial.html#transposing-an-image
@@ -316,6 +355,19 @@ print("Example #23: Saved masked hopper!")
 console.print(Rule())
 code.interact(local=globals(), readfunc=readfunc, banner=banner)
 
+# ===============================================================================
+# Example #23 Process bands (compiled into lookup tables)
+# ===============================================================================
+console.print(Rule("[bold magenta]Example #23 (compiled)[/bold magenta]"))
+im = Image.open(os.path.join("img", "hopper.ppm"))
+# same edit as above: one mask table, one green table, one composite
+program = PointProgram({"G": where(R < 100, G * 0.7, G)})
+im = program.apply(im)
+im.save(os.path.join("img", "masked_hopper.jpg"))
+print(f"Example #23: Saved masked hopper with passes {program.passes()}!")
+console.print(Rule())
+code.interact(local=globals(), readfunc=readfunc, banner=banner)
+
 # ===============================================================================
 # Example #24 Enhance image
 # https://pillow.readthedocs.io/en/stable/handbook/tutorial.html#enhancement
@@ -329,6 +381,19 @@ print("Example #24: Saved contrasted hopper!")
 console.print(Rule())
 code.interact(local=globals(), readfunc=readfunc, banner=banner)
 
+# ===============================================================================
+# Example #21 and #24 on tiles (filter and enhance on a thread pool)
+# ===============================================================================
+console.print(Rule("[bold magenta]Example #21/#24 (tiled)[/bold magenta]"))
+im = Image.open(os.path.join("img", "slide12.jpg"))
+# tiles overlap by the kernel's reach, so the seams are invisible
+im = filter_tiled(im, ImageFilter.DETAIL)
+im = enhance_tiled(im, ImageEnhance.Contrast, 1.3)
+im.save(os.path.join("img", "enhanced_slide12.jpg"))
+print("Example #21/#24: Saved enhanced slide!")
+console.print(Rule())
+code.interact(local=globals(), readfunc=readfunc, banner=banner)
+
 # ===============================================================================
 # Example #25 Image sequences
 # https://pillow.readthedocs.io/en/stable/handbook/tutorial.html#image-sequences
@@ -345,6 +410,19 @@ print("Example #25: Saved all frames.")
 console.print(Rule())
 code.interact(local=globals(), readfunc=readfunc, banner=banner)
 
+# ===============================================================================
+# Example #25 Image sequences (decode in order, encode in parallel)
+# ===============================================================================
+console.print(Rule("[bold magenta]Example #25[/bold magenta]"))
+for i, path in export_frames(
+    os.path.join("img", "snorkle.gif"),
+    lambda i: os.path.join("img", f"snorkle_{i + 1}.png"),
+):
+    print(f"Example #25: Saved snorkle frame {i + 1}!")
+print("Example #25: Saved all frames.")
+console.print(Rule())
+code.interact(local=globals(), readfunc=readfunc, banner=banner)
+
 # ===============================================================================
 # Example #26 Print postscript
 # https://pillow.readthedocs.io/en/stable/handbook/tutorial.html#postscript-printing
@@ -352,10 +430,22 @@ code.interact(local=globals(), readfunc=readfunc, banner=banner)
 console.print(Rule("[bold magenta]Example #26[/bold magenta]"))
 import ps  # noqa
 
+ps.print_hopper()
 print("Example #26: Saved postscript hopper!")
 console.print(Rule())
 code.interact(local=globals(), readfunc=readfunc, banner=banner)
 
+# ===============================================================================
+# Example #26 Print every JPEG in img/ as a multi-page document
+# ===============================================================================
+console.print(Rule("[bold magenta]Example #26 (book)[/bold magenta]"))
+# Threads, as in Example #29: process workers would re-import this script.
+with ThreadPoolExecutor() as executor:
+    pprint(ps.print_book(executor=executor))
+print("Example #26: Saved img/hopper_book.pdf!")
+console.print(Rule())
+code.interact(local=globals(), readfunc=readfunc, banner=banner)
+
 # ===============================================================================
 # Example #27 Reading from an open file
 # https://pillow.readthedocs.io/en/stable/handbook/tutorial.html#reading-from-an-open-file
@@ -416,6 +506,24 @@ for path in paths:
 console.print(Rule())
 code.interact(local=globals(), readfunc=readfunc, banner=banner)
 
+# ===============================================================================
+# Example #29 Batch processing (parallel)
+# ===============================================================================
+console.print(Rule("[bold magenta]Example #29[/bold magenta]"))
+# Threads rather than the default process pool: worker processes would
+# re-import this (interactive) script. Pillow releases the GIL while
+# decoding and encoding, so threads still run in parallel.
+with ThreadPoolExecutor() as executor:
+    results, summary = compress_batch(
+        os.path.join("img", "*.png"),
+        batch_dir,
+        callback=lambda r: print(r.dest),
+        executor=executor,
+    )
+pprint(summary)
+console.print(Rule())
+code.interact(local=globals(), readfunc=readfunc, banner=banner)
+
 # ===============================================================================
 # Example #30
 # https://pillow.readthedocs.io/en/stable/handbook/tutorial.html#reading-in-draft-mode
@@ -504,6 +612,17 @@ pprint(im.info)
 console.print(Rule())
 code.interact(local=globals(), readfunc=readfunc, banner=banner)
 
+# ===============================================================================
+# Example #36 Index a whole directory from headers only
+# ===============================================================================
+console.print(Rule("[bold magenta]Example #36 (index)[/bold magenta]"))
+with MetadataIndex(":memory:") as index:
+    pprint(index.refresh("img"))
+    for record in index.query(min_width=2000, order_by="width"):
+        print(record.path, record.format, (record.width, record.height), record.mode)
+console.print(Rule())
+code.interact(local=globals(), readfunc=readfunc, banner=banner)
+
 # ===============================================================================
 # Example #37
 # https://pillow.readthedocs.io/en/stable/handbook/concepts.html#transparency
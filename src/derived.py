@@ -0,0 +1,231 @@
+from PIL import Image
+from buffer import save_image_to_buffer
+from collections import OrderedDict
+from manifest import file_digest
+import enum
+import hashlib
+import json
+import os
+import threading
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "derived")
+
+
+def _plain(value):
+    # JSON fallback for op arguments: enums by value, filter objects and the
+    # like by class name and attributes (never by repr, which has ids in it).
+    # Functions are refused: what a lambda or closure computes isn't in its
+    # name, so two different ones would share a key.
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, type):
+        return value.__name__
+    if callable(value):
+        raise TypeError(f"can't build a cache key from the callable {value!r}")
+    if hasattr(value, "__dict__"):
+        return [type(value).__name__, vars(value)]
+    return repr(value)
+
+
+def normalize_ops(ops):
+    """Canonical JSON text for an op chain.
+
+    ops is a sequence of (name, *args) tuples, or a Pipeline, whose
+    rewritten steps are used, so chains that optimize to the same steps
+    share cache entries. A Pipeline's exact flag is part of the text too,
+    since exact=False renders different pixels. Functions can't be part of
+    a key and raise TypeError.
+    """
+    if hasattr(ops, "steps"):
+        ops = [("pipeline", {"exact": ops.exact})] + ops.steps()
+    return json.dumps(
+        [list(op) for op in ops], default=_plain, separators=(",", ":"), sort_keys=True
+    )
+
+
+class DerivedCache:
+    """Encoded derived images, keyed by what they were derived from.
+
+    A key is the sha256 of (source content hash, normalized op chain,
+    output format and encoder params), so renaming or touching a source
+    doesn't invalidate anything and editing it always does. Lookups go to
+    an in-memory LRU of encoded bytes first, then to an on-disk tier; both
+    evict least recently used entries to stay under their byte budgets.
+    """
+
+    def __init__(
+        self, directory=DEFAULT_CACHE_DIR, memory_bytes=64 << 20, disk_bytes=1 << 30
+    ):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._disk = OrderedDict()
+        self._disk_used = 0
+        self._digests = {}
+        self._lock = threading.Lock()
+        self.stats = dict.fromkeys(
+            [
+                "memory_hits",
+                "disk_hits",
+                "misses",
+                "memory_evictions",
+                "disk_evictions",
+            ],
+            0,
+        )
+        os.makedirs(directory, exist_ok=True)
+        self._load_disk_index()
+
+    def _load_disk_index(self):
+        # Oldest first, by mtime, which get() bumps on every disk hit.
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                continue
+            st = os.stat(os.path.join(self.directory, name))
+            entries.append((st.st_mtime_ns, name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_used += size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def source_digest(self, path):
+        """sha256 of a source file, remembered until its size or mtime
+        changes."""
+        st = os.stat(path)
+        memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        digest = self._digests.get(memo_key)
+        if digest is None:
+            digest = self._digests[memo_key] = file_digest(path)
+        return digest
+
+    def _source_id(self, source):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return hashlib.sha256(source).hexdigest()
+        if isinstance(source, Image.Image):
+            h = hashlib.sha256(f"{source.mode} {source.size}".encode())
+            if source.mode in ("P", "PA"):
+                # Same indices, different palette: a different image.
+                h.update(bytes(source.getpalette()))
+                h.update(repr(source.info.get("transparency")).encode())
+            h.update(source.tobytes())
+            return h.hexdigest()
+        if isinstance(source, (list, tuple)):
+            return [self._source_id(s) for s in source]
+        return self.source_digest(source)
+
+    def key(self, source, ops, format="PNG", **params):
+        """Cache key for source (a path, bytes, an Image, or a list of
+        those) put through ops and encoded as format with params."""
+        text = json.dumps(
+            [self._source_id(source), normalize_ops(ops), format.upper(), params],
+            default=_plain,
+            sort_keys=True,
+        )
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, key):
+        """Encoded bytes for key, or None."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return data
+            if key not in self._disk:
+                self.stats["misses"] += 1
+                return None
+            self._disk.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            # Removed behind our back; treat as a miss.
+            with self._lock:
+                self._disk_used -= self._disk.pop(key, 0)
+                self.stats["misses"] += 1
+            return None
+        with self._lock:
+            self.stats["disk_hits"] += 1
+            self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        data = bytes(data)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._disk_used += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            self._remember(key, data)
+            self._evict_disk()
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_bytes:
+            return
+        self._memory_used += len(data) - len(self._memory.pop(key, b""))
+        self._memory[key] = data
+        while self._memory_used > self.memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_used -= len(old)
+            self.stats["memory_evictions"] += 1
+
+    def _evict_disk(self):
+        while self._disk_used > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_used -= size
+            self.stats["disk_evictions"] += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def get_or_render(self, source, ops, render, format="PNG", **params):
+        """Cached bytes for (source, ops, format, params); on a miss,
+        render() is called for an Image (or encoded bytes), which is
+        encoded and stored."""
+        key = self.key(source, ops, format, **params)
+        data = self.get(key)
+        if data is None:
+            result = render()
+            if isinstance(result, Image.Image):
+                result = save_image_to_buffer(result, format, **params).getvalue()
+            data = bytes(result)
+            self.put(key, data)
+        return data
+
+    def pipeline(self, pipeline, format="PNG", **params):
+        """Encoded output of a Pipeline, rendered only on a cache miss."""
+        return self.get_or_render(
+            pipeline.source, pipeline, pipeline.run, format, **params
+        )
+
+    def info(self):
+        """Counters plus current tier sizes."""
+        with self._lock:
+            return dict(
+                self.stats,
+                memory_entries=len(self._memory),
+                memory_bytes=self._memory_used,
+                disk_entries=len(self._disk),
+                disk_bytes=self._disk_used,
+            )
+
+    def clear(self):
+        with self._lock:
+            for key in self._disk:
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self._memory.clear()
+            self._disk.clear()
+            self._memory_used = self._disk_used = 0
@@ -0,0 +1,63 @@
+from PIL import Image
+from bounded import bounded_submit
+from contextlib import closing
+import os
+
+
+def iter_frames(source, start=0, stop=None, step=1, until=None):
+    """Yield (index, frame) for an animated image, decoding sequentially.
+
+    Each frame is a copy, so it stays valid after the source seeks on.
+    start/stop/step pick a range and every-Nth sampling; skipped frames
+    still have to be decoded (GIF frames build on each other) but are never
+    copied. until(index, frame), if given, stops the walk when it returns
+    true; that frame is not yielded.
+    """
+    im = Image.open(source) if isinstance(source, (str, os.PathLike)) else source
+    try:
+        n_frames = getattr(im, "n_frames", 1)
+        stop = n_frames if stop is None else min(stop, n_frames)
+        for index in range(start, stop, step):
+            im.seek(index)
+            if until is not None and until(index, im):
+                return
+            yield index, im.copy()
+    finally:
+        if im is not source:
+            im.close()
+
+
+def _save_frame(index, frame, path, params):
+    frame.save(path, **params)
+    return path
+
+
+def export_frames(
+    source,
+    dest,
+    start=0,
+    stop=None,
+    step=1,
+    until=None,
+    workers=None,
+    max_pending=None,
+    executor=None,
+    **params,
+):
+    """Decode frames in order and encode them on a worker pool.
+
+    dest is a format string taking the frame index ("frame_{}.png") or a
+    callable mapping index to path. Frames are queued through
+    bounded_submit, at most max_pending at a time, so memory stays flat
+    however long the animation is. Pillow's encoders release the GIL, so
+    the default thread pool keeps several cores busy; pass a
+    ProcessPoolExecutor as executor to encode in other processes instead. Returns [(index, path), ...] in frame order.
+    """
+    path_for = dest if callable(dest) else dest.format
+    calls = (
+        (index, frame, path_for(index), params)
+        for index, frame in iter_frames(source, start, stop, step, until)
+    )
+    done = bounded_submit(_save_frame, calls, workers, max_pending, executor)
+    with closing(done):
+        return [(args[0], future.result()) for args, future in done]
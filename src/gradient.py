@@ -0,0 +1,126 @@
+from PIL import Image, ImageColor
+from functools import lru_cache
+import math
+
+# Image.radial_gradient("L") hits 255 in its corners, 128 * sqrt(2) from the
+# center, so 128px out (the edge midpoints) it is only this far along.
+RADIAL_TOP = 255 / math.sqrt(2)
+
+
+def _normalize_stops(stops):
+    # Accept plain colors (evenly spaced) or (offset, color) pairs with
+    # offsets in [0, 1]; return a hashable tuple of (offset, rgba) pairs.
+    stops = list(stops)
+    if not stops:
+        raise ValueError("a gradient needs at least one color stop")
+    is_pair = isinstance(stops[0], tuple) and len(stops[0]) == 2
+    if not (is_pair and isinstance(stops[0][1], (str, tuple, list))):
+        n = max(len(stops) - 1, 1)
+        stops = [(i / n, color) for i, color in enumerate(stops)]
+    out = []
+    for offset, color in sorted(stops, key=lambda s: s[0]):
+        if isinstance(color, str):
+            color = ImageColor.getrgb(color)
+        out.append((float(offset), tuple(color) + (255,) * (4 - len(color))))
+    return tuple(out)
+
+
+def _palette(stops, top=255):
+    # 256-entry RGBA ramp interpolated between the stops; index top (and
+    # anything above it) is the end of the gradient.
+    palette = []
+    for i in range(256):
+        t = min(i / top, 1.0)
+        lo = stops[0]
+        hi = stops[-1]
+        for a, b in zip(stops, stops[1:]):
+            if a[0] <= t <= b[0]:
+                lo, hi = a, b
+                break
+        span = hi[0] - lo[0]
+        f = 0.0 if span <= 0 else min(max((t - lo[0]) / span, 0.0), 1.0)
+        palette.extend(round(x + (y - x) * f) for x, y in zip(lo[1], hi[1]))
+    return palette
+
+
+def _colorize(ramp, stops, mode, top=255):
+    # ramp is an "L" image of 0..top positions along the gradient. Giving it
+    # the interpolated palette and converting maps every pixel to its color
+    # in one C pass, instead of a point() or composite per channel.
+    ramp.putpalette(_palette(stops, top), "RGBA")
+    return ramp.convert(mode)
+
+
+def _linear_ramp(size, angle):
+    w, h = size
+    if angle % 90 == 0:
+        # Axis-aligned: build a single row or column and stretch it.
+        quarter = int(angle % 360) // 90
+        length = h if quarter % 2 else w
+        line = Image.new("L", (1, length) if quarter % 2 else (length, 1))
+        ramp = [255 * i // max(length - 1, 1) for i in range(length)]
+        line.putdata(ramp[::-1] if quarter >= 2 else ramp)
+        return line.resize(size, Image.NEAREST)
+
+    # Any other angle: sample Pillow's 256x256 vertical ramp through an
+    # affine transform that projects each pixel onto the gradient axis.
+    c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    corners = [x * c + y * s for x in (0, w) for y in (0, h)]
+    lo, extent = min(corners), max(corners) - min(corners)
+    k = 255.999 / extent
+    data = (0, 0, 128, c * k, s * k, -lo * k)
+    return Image.linear_gradient("L").transform(
+        size, Image.AFFINE, data, Image.NEAREST, fillcolor=255
+    )
+
+
+def _radial_ramp(size, center, radius):
+    w, h = size
+    cx, cy = center if center is not None else (w / 2, h / 2)
+    if radius is None:
+        # Far enough to reach the furthest corner.
+        radius = max(math.hypot(x - cx, y - cy) for x in (0, w) for y in (0, h))
+    # Map radius onto 128px of Pillow's radial ramp, which is where it
+    # reaches RADIAL_TOP; everything further out takes fillcolor.
+    k = 128 / radius
+    data = (k, 0, 128 - cx * k, 0, k, 128 - cy * k)
+    return Image.radial_gradient("L").transform(
+        size, Image.AFFINE, data, Image.BILINEAR, fillcolor=255
+    )
+
+
+def linear_gradient(size, stops, angle=90, mode="RGB"):
+    """Linear gradient through stops; angle 0 runs left to right, 90 top
+    to bottom."""
+    return _colorize(_linear_ramp(size, angle), _normalize_stops(stops), mode)
+
+
+def radial_gradient(size, stops, center=None, radius=None, mode="RGB"):
+    """Radial gradient from center (default: the middle) out to radius
+    (default: the furthest corner)."""
+    ramp = _radial_ramp(size, center, radius)
+    return _colorize(ramp, _normalize_stops(stops), mode, RADIAL_TOP)
+
+
+@lru_cache(maxsize=32)
+def _cached(kind, size, stops, mode, args):
+    if kind == "linear":
+        return _colorize(_linear_ramp(size, *args), stops, mode)
+    return _colorize(_radial_ramp(size, *args), stops, mode, RADIAL_TOP)
+
+
+def cached_gradient(kind, size, stops, mode="RGB", **kwargs):
+    """linear_gradient/radial_gradient behind an LRU cache.
+
+    Returns a copy, so callers can draw on the result without poisoning
+    the cache.
+    """
+    if kind == "linear":
+        args = (kwargs.get("angle", 90),)
+    elif kind == "radial":
+        # The args are cache keys, so a list center has to become a tuple.
+        center = kwargs.get("center")
+        args = (None if center is None else tuple(center), kwargs.get("radius"))
+    else:
+        raise ValueError(f"unknown gradient kind {kind!r}")
+    return _cached(kind, tuple(size), _normalize_stops(stops), mode, args).copy()
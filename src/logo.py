@@ -1,4 +1,5 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
+from banner import find_font
 import os
 
 # Create a blank image with white background
@@ -6,13 +7,8 @@ width, height = 400, 200
 image = Image.new("RGB", (width, height), "white")
 draw = ImageDraw.Draw(image)
 
-# Define the font and size
-try:
-    font = ImageFont.truetype("Arial.ttf", 40)  # macos
-except OSError:
-    font = ImageFont.truetype(
-        "/usr/share/fonts/liberation-mono/LiberationMono-Regular.ttf"
-    )  # linux
+# Define the font and size (Arial on macos, Liberation on linux)
+font = find_font(40)
 
 # Draw a rectangle (as a placeholder for a logo icon)
 rectangle_width, rectangle_height = 100, 100
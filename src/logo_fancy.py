@@ -1,20 +1,12 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageDraw
+from banner import find_font
+from gradient import cached_gradient
 import os
 
 
 # Function to create a gradient background
 def create_gradient(width, height, start_color, end_color):
-    base = Image.new("RGB", (width, height), start_color)
-    top = Image.new("RGB", (width, height), end_color)
-    mask = Image.new("L", (width, height))
-    mask_data = []
-
-    for y in range(height):
-        mask_data.extend([int(255 * (y / height))] * width)
-
-    mask.putdata(mask_data)
-    base.paste(top, (0, 0), mask)
-    return base
+    return cached_gradient("linear", (width, height), [start_color, end_color])
 
 
 # Create a blank image with a gradient background
@@ -36,15 +28,9 @@ draw.ellipse(
     outline="black",
 )
 
-# Define the font and size
-try:
-    font_path = "Arial.ttf"  # macos
-    font = ImageFont.truetype(font_path, 50)
-    font_bold = ImageFont.truetype(font_path, 70)
-except OSError:
-    font_path = "/usr/share/fonts/liberation-mono/LiberationMono-Regular.ttf"  # linux
-    font = ImageFont.truetype(font_path, 50)
-    font_bold = ImageFont.truetype(font_path, 70)
+# Define the font and size (Arial on macos, Liberation on linux)
+font = find_font(50)
+font_bold = find_font(70)
 
 # Add styled text next to the circle
 text = "Pillow Demo"
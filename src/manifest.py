@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = ".manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """sha256 hex digest of a file, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(path):
+    """Return the manifest entries keyed by source path, or {} if missing."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("entries", {})
+
+
+def save_manifest(path, entries):
+    # Write then rename, so an interrupted run never leaves a torn manifest.
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "entries": entries}, f, indent=1)
+    os.replace(tmp, path)
+
+
+def make_entry(source_path, dest_path, settings, source_sha256=None):
+    st = os.stat(source_path)
+    return {
+        "dest": str(dest_path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": source_sha256 or file_digest(source_path),
+        "settings": settings,
+        "output_size": os.path.getsize(dest_path),
+        "output_sha256": file_digest(dest_path),
+    }
+
+
+def make_duplicate_entry(source_path, dest_path, settings, duplicate_of):
+    """Entry for a source dropped as a near-duplicate of duplicate_of."""
+    st = os.stat(source_path)
+    return {
+        "dest": str(dest_path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": file_digest(source_path),
+        "settings": settings,
+        "duplicate_of": str(duplicate_of),
+    }
+
+
+def _source_unchanged(entry, source_path):
+    try:
+        st = os.stat(source_path)
+    except OSError:
+        return False
+    if st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]:
+        return True
+    if st.st_size != entry["size"] or file_digest(source_path) != entry["sha256"]:
+        return False
+    entry["mtime_ns"] = st.st_mtime_ns
+    return True
+
+
+def is_current(entry, source_path, dest_path, settings):
+    """Decide whether dest_path is still a valid encode of source_path.
+
+    mtime and size are checked first; the source is only hashed when they
+    differ, so a touched-but-unchanged file is still skipped. If the hash
+    matches, the entry's stat fields are refreshed in place.
+    """
+    if (
+        entry is None
+        or "duplicate_of" in entry
+        or entry["settings"] != settings
+        or entry["dest"] != str(dest_path)
+    ):
+        return False
+    try:
+        if os.path.getsize(dest_path) != entry["output_size"]:
+            return False
+    except OSError:
+        return False
+    return _source_unchanged(entry, source_path)
+
+
+def is_current_duplicate(entry, source_path, settings):
+    """Like is_current, for an entry from make_duplicate_entry()."""
+    if entry is None or "duplicate_of" not in entry or entry["settings"] != settings:
+        return False
+    return _source_unchanged(entry, source_path)
+
+
+def prune(entries):
+    """Delete outputs whose source no longer exists. Returns removed dests."""
+    removed = []
+    for source_path in list(entries):
+        if os.path.exists(source_path):
+            continue
+        dest_path = entries.pop(source_path)["dest"]
+        try:
+            os.remove(dest_path)
+        except FileNotFoundError:
+            pass
+        removed.append(dest_path)
+    return removed
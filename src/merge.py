@@ -1,6 +1,11 @@
 from PIL import Image
+from metrics import traced
+from thumbnail import fit_size
+from tiled import TiledCanvas
+import math
 
 
+@traced("merge.merge")
 def merge(im1, im2):
     w = im1.size[0] + im2.size[0]
     h = max(im1.size[1], im2.size[1])
@@ -10,3 +15,127 @@ def merge(im1, im2):
     im.paste(im2, (im1.size[0], 0))
 
     return im
+
+
+def read_sizes(paths):
+    """Image sizes from headers only; no pixel data is decoded."""
+    sizes = []
+    for path in paths:
+        with Image.open(path) as im:
+            sizes.append(im.size)
+    return sizes
+
+
+def plan_layout(sizes, layout="horizontal", columns=None, padding=0):
+    """Work out where each tile goes.
+
+    layout is "horizontal", "vertical" or "grid". Grid columns default to
+    roughly square; each grid column is as wide as its widest tile and each
+    row as tall as its tallest. Returns (canvas_size, [(x, y), ...]).
+    """
+    n = len(sizes)
+    if layout == "horizontal":
+        columns = n
+    elif layout == "vertical":
+        columns = 1
+    elif layout == "grid":
+        columns = columns or max(1, math.ceil(math.sqrt(n)))
+    else:
+        raise ValueError(f"unknown layout {layout!r}")
+    rows = max(1, math.ceil(n / columns))
+
+    col_widths = [0] * columns
+    row_heights = [0] * rows
+    for i, (w, h) in enumerate(sizes):
+        row, col = divmod(i, columns)
+        col_widths[col] = max(col_widths[col], w)
+        row_heights[row] = max(row_heights[row], h)
+
+    xs = [padding]
+    for w in col_widths[:-1]:
+        xs.append(xs[-1] + w + padding)
+    ys = [padding]
+    for h in row_heights[:-1]:
+        ys.append(ys[-1] + h + padding)
+
+    positions = [(xs[i % columns], ys[i // columns]) for i in range(n)]
+    canvas_size = (
+        sum(col_widths) + padding * (columns + 1),
+        sum(row_heights) + padding * (rows + 1),
+    )
+    return canvas_size, positions
+
+
+@traced("merge.contact_sheet")
+def contact_sheet(
+    paths,
+    layout="horizontal",
+    columns=None,
+    padding=0,
+    tile_size=None,
+    mode="RGB",
+    background=None,
+):
+    """Join any number of image files into one sheet.
+
+    The layout is planned from header-only size reads, then tiles are
+    decoded, pasted and closed one at a time, so peak memory is about the
+    canvas plus a single tile. With tile_size, each tile is shrunk to fit
+    that box (using JPEG draft mode where possible) before pasting.
+    """
+    paths = list(paths)
+    sizes = read_sizes(paths)
+    if tile_size is not None:
+        sizes = [fit_size(size, tile_size) for size in sizes]
+    canvas_size, positions = plan_layout(sizes, layout, columns, padding)
+
+    sheet = Image.new(mode, canvas_size, background)
+    _paste_tiles(sheet, paths, sizes, positions)
+    return sheet
+
+
+@traced("merge.merge_images")
+def merge_images(images, layout="horizontal", columns=None, padding=0, mode="RGB"):
+    """contact_sheet for images that are already open."""
+    canvas_size, positions = plan_layout(
+        [im.size for im in images], layout, columns, padding
+    )
+    sheet = Image.new(mode, canvas_size)
+    for im, position in zip(images, positions):
+        sheet.paste(im, position)
+    return sheet
+
+
+def contact_sheet_tiff(
+    dest_path,
+    paths,
+    layout="horizontal",
+    columns=None,
+    padding=0,
+    tile_size=None,
+    mode="RGB",
+    background=0,
+):
+    """contact_sheet for outputs bigger than RAM.
+
+    Tiles are pasted into a TiledCanvas backed by a scratch file, which is
+    then streamed to dest_path as a tiled TIFF.
+    """
+    paths = list(paths)
+    sizes = read_sizes(paths)
+    if tile_size is not None:
+        sizes = [fit_size(size, tile_size) for size in sizes]
+    canvas_size, positions = plan_layout(sizes, layout, columns, padding)
+
+    with TiledCanvas(canvas_size, mode, background=background) as sheet:
+        _paste_tiles(sheet, paths, sizes, positions)
+        sheet.save_tiff(dest_path)
+
+
+def _paste_tiles(sheet, paths, sizes, positions):
+    for path, size, position in zip(paths, sizes, positions):
+        with Image.open(path) as tile:
+            if tile.size != size:
+                tile.draft(tile.mode, size)
+                tile = tile.resize(size, Image.LANCZOS)
+            sheet.paste(tile, position)
@@ -0,0 +1,299 @@
+from PIL import Image
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import sqlite3
+
+INDEX_NAME = ".imageindex.sqlite"
+
+COLUMNS = [
+    "path",
+    "mtime_ns",
+    "file_size",
+    "format",
+    "mode",
+    "width",
+    "height",
+    "bands",
+    "frames",
+    "has_exif",
+    "has_icc",
+    "info",
+    "error",
+]
+
+# One indexed file. bands is a string like "RGB"; info holds the simple
+# (JSON-able) entries of Image.info; error is set when the header can't
+# be read, with the other image fields left as None.
+ImageRecord = namedtuple("ImageRecord", COLUMNS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    file_size INTEGER NOT NULL,
+    format TEXT,
+    mode TEXT,
+    width INTEGER,
+    height INTEGER,
+    bands TEXT,
+    frames INTEGER,
+    has_exif INTEGER,
+    has_icc INTEGER,
+    info TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS images_size ON images (width, height);
+CREATE INDEX IF NOT EXISTS images_format ON images (format);
+"""
+
+# Rows for a directory or anything below it. Not LIKE, which ignores
+# ASCII case, so "img/" would match "IMG/x.png".
+UNDER = "path = ? OR substr(path, 1, length(?)) = ?"
+
+# TIFF tag pointing at the EXIF IFD.
+EXIF_IFD = 34665
+
+
+def _simple(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return True
+    if isinstance(value, (tuple, list)):
+        return all(_simple(v) for v in value)
+    return False
+
+
+def read_header(path):
+    """Header fields for one file, without decoding any pixel data.
+
+    Returns a dict of the ImageRecord fields other than path/mtime/size.
+    """
+    try:
+        with Image.open(path) as im:
+            if im.format == "TIFF":
+                has_exif = EXIF_IFD in im.tag_v2
+            else:
+                has_exif = "exif" in im.info
+            return {
+                "format": im.format,
+                "mode": im.mode,
+                "width": im.width,
+                "height": im.height,
+                "bands": "".join(im.getbands()),
+                # Counting GIF/APNG frames walks the frame headers but
+                # skips their pixel data.
+                "frames": getattr(im, "n_frames", 1),
+                "has_exif": bool(has_exif),
+                "has_icc": bool(im.info.get("icc_profile")),
+                "info": json.dumps(
+                    {k: v for k, v in im.info.items() if _simple(v)}, sort_keys=True
+                ),
+                "error": None,
+            }
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+def iter_image_files(root, extensions=None):
+    """Yield (path, stat) for image files under root, by extension."""
+    if extensions is None:
+        extensions = Image.registered_extensions()
+    stack = [root]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif os.path.splitext(entry.name)[1].lower() in extensions:
+                try:
+                    yield entry.path, entry.stat()
+                except OSError:
+                    pass
+
+
+class MetadataIndex:
+    """Image header metadata for directory trees, kept in SQLite.
+
+    refresh() walks the roots and re-reads headers only for files whose
+    mtime or size changed since the last run; query() answers questions
+    like "all PNGs at least 1000 pixels wide" without touching the images.
+    """
+
+    def __init__(self, db_path=INDEX_NAME):
+        self.db_path = db_path
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def refresh(self, roots, extensions=None, prune=True, workers=None):
+        """Bring the index up to date with the files under roots.
+
+        Headers of new and changed files are read on a thread pool (this
+        is mostly waiting on the disk). With prune, rows for files under
+        roots that no longer exist are dropped. Returns a summary dict.
+        """
+        if isinstance(roots, (str, os.PathLike)):
+            roots = [roots]
+        roots = [os.path.abspath(root) for root in roots]
+
+        known = {}
+        for root in roots:
+            for path, mtime_ns, file_size in self.db.execute(
+                "SELECT path, mtime_ns, file_size FROM images " f"WHERE {UNDER}",
+                _under_params(root),
+            ):
+                known[path] = (mtime_ns, file_size)
+
+        seen = set()
+        stale = []
+        for root in roots:
+            for path, st in iter_image_files(root, extensions):
+                seen.add(path)
+                if known.get(path) != (st.st_mtime_ns, st.st_size):
+                    stale.append((path, st))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            headers = executor.map(read_header, [path for path, st in stale])
+            rows = [
+                _row(path, st, header) for (path, st), header in zip(stale, headers)
+            ]
+
+        removed = [path for path in known if path not in seen] if prune else []
+        self._store(rows, removed)
+
+        return {
+            "files": len(seen),
+            "added": sum(1 for path, st in stale if path not in known),
+            "updated": sum(1 for path, st in stale if path in known),
+            "unchanged": len(seen) - len(stale),
+            "removed": len(removed),
+            "failed": sum(1 for row in rows if row[-1] is not None),
+        }
+
+    def _store(self, rows, removed=()):
+        # One transaction per batch; row-at-a-time commits are what make
+        # naive SQLite inserts slow.
+        with self.db:
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO images VALUES "
+                f"({', '.join('?' * len(COLUMNS))})",
+                rows,
+            )
+            self.db.executemany(
+                "DELETE FROM images WHERE path = ?", [(p,) for p in removed]
+            )
+
+    def get(self, path):
+        row = self.db.execute(
+            "SELECT * FROM images WHERE path = ?", (os.path.abspath(path),)
+        ).fetchone()
+        return ImageRecord(*row) if row else None
+
+    def query(
+        self,
+        under=None,
+        format=None,
+        mode=None,
+        min_width=None,
+        max_width=None,
+        min_height=None,
+        max_height=None,
+        animated=None,
+        has_exif=None,
+        has_icc=None,
+        errors=False,
+        order_by="path",
+        limit=None,
+    ):
+        """ImageRecords matching every given filter.
+
+        format and mode may be a single value or a collection of them.
+        Files whose headers couldn't be read are left out unless errors is
+        true.
+        """
+        if order_by not in COLUMNS:
+            raise ValueError(f"can't order by {order_by!r}")
+        where, params = [], []
+        if under is not None:
+            under = os.path.abspath(under)
+            where.append(f"({UNDER})")
+            params += _under_params(under)
+        for column, value in (("format", format), ("mode", mode)):
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            where.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params += values
+        for clause, value in (
+            ("width >= ?", min_width),
+            ("width <= ?", max_width),
+            ("height >= ?", min_height),
+            ("height <= ?", max_height),
+        ):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        if animated is not None:
+            where.append("frames > 1" if animated else "frames = 1")
+        for column, value in (("has_exif", has_exif), ("has_icc", has_icc)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(int(bool(value)))
+        if not errors:
+            where.append("error IS NULL")
+
+        sql = "SELECT * FROM images"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [ImageRecord(*row) for row in self.db.execute(sql, params)]
+
+    def sizes(self, paths):
+        """(width, height) for each path, like merge.read_sizes, answered
+        from the index; files it doesn't know, or whose mtime or size no
+        longer match it, are read and (re)indexed."""
+        sizes, rows = [], []
+        for path in paths:
+            path = os.path.abspath(path)
+            st = os.stat(path)
+            record = self.get(path)
+            if (
+                record is None
+                or record.error is not None
+                or (record.mtime_ns, record.file_size) != (st.st_mtime_ns, st.st_size)
+            ):
+                row = _row(path, st, read_header(path))
+                rows.append(row)
+                record = ImageRecord(*row)
+                if record.error is not None:
+                    self._store(rows)
+                    raise OSError(f"{path}: {record.error}")
+            sizes.append((record.width, record.height))
+        self._store(rows)
+        return sizes
+
+
+def _under_params(directory):
+    prefix = directory.rstrip(os.sep) + os.sep
+    return directory, prefix, prefix
+
+
+def _row(path, st, header):
+    fields = dict.fromkeys(COLUMNS)
+    fields.update(header, path=path, mtime_ns=st.st_mtime_ns, file_size=st.st_size)
+    return tuple(fields[column] for column in COLUMNS)
@@ -0,0 +1,255 @@
+from PIL import Image
+from functools import wraps
+import json
+import os
+import threading
+import time
+
+# Latency histogram bucket bounds, in seconds.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+PREFIX = "pillow_demo"
+
+# Off unless turned on with enable() or PILLOW_DEMO_METRICS=1. While off,
+# span() hands out one shared do-nothing object and traced() functions
+# pay a single global lookup per call.
+_enabled = os.environ.get("PILLOW_DEMO_METRICS") == "1"
+_ops = {}
+_lock = threading.Lock()
+
+COUNTERS = (
+    "pixels_in",
+    "pixels_out",
+    "bytes_in",
+    "bytes_out",
+    "decoded_bytes",
+)
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def is_enabled():
+    return _enabled
+
+
+def image_bytes(im):
+    """Memory Pillow holds for im's pixels (3-band modes are stored as 4)."""
+    if im.mode in ("1", "L", "P"):
+        pixel = 1
+    elif im.mode.startswith("I;16"):
+        pixel = 2
+    else:
+        pixel = 4
+    return im.width * im.height * pixel
+
+
+class _OpStats:
+    __slots__ = ("count", "errors", "seconds", "buckets", "peak_decoded") + COUNTERS
+
+    def __init__(self):
+        self.count = self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.peak_decoded = 0
+        for name in COUNTERS:
+            setattr(self, name, 0)
+
+
+class Span:
+    """Times one operation and collects its sizes; use as a context manager.
+
+    record() adds to the counters (pixels_in/out, bytes_in/out,
+    decoded_bytes); image_in()/image_out() record an image's pixels, and
+    image_out() its decoded size too.
+    """
+
+    def __init__(self, op):
+        self.op = op
+        self.counts = dict.fromkeys(COUNTERS, 0)
+
+    def record(self, **counts):
+        for name, value in counts.items():
+            self.counts[name] += value
+
+    def image_in(self, im):
+        self.counts["pixels_in"] += im.width * im.height
+
+    def image_out(self, im):
+        self.counts["pixels_out"] += im.width * im.height
+        self.counts["decoded_bytes"] += image_bytes(im)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        with _lock:
+            stats = _ops.get(self.op)
+            if stats is None:
+                stats = _ops[self.op] = _OpStats()
+            stats.count += 1
+            stats.errors += exc_type is not None
+            stats.seconds += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stats.buckets[i] += 1
+                    break
+            for name, value in self.counts.items():
+                setattr(stats, name, getattr(stats, name) + value)
+            stats.peak_decoded = max(stats.peak_decoded, self.counts["decoded_bytes"])
+        return False
+
+
+class _NullSpan:
+    def record(self, **counts):
+        pass
+
+    def image_in(self, im):
+        pass
+
+    def image_out(self, im):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span(op):
+    """Context manager timing op; a no-op when metrics are off."""
+    return Span(op) if _enabled else NULL_SPAN
+
+
+def _images(value):
+    if isinstance(value, Image.Image):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            if isinstance(item, Image.Image):
+                yield item
+
+
+def traced(op=None):
+    """Decorator: time each call as op (default: the function's name).
+
+    Images passed as arguments (or in a list/tuple argument) count as
+    input pixels; an Image returned (or first in a returned tuple) counts
+    as output.
+    """
+
+    def decorate(fn):
+        name = op or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(name) as s:
+                for arg in args:
+                    for im in _images(arg):
+                        s.image_in(im)
+                result = fn(*args, **kwargs)
+                out = result[0] if isinstance(result, tuple) and result else result
+                if isinstance(out, Image.Image):
+                    s.image_out(out)
+                return result
+
+        return wrapper
+
+    return decorate
+
+
+def reset():
+    with _lock:
+        _ops.clear()
+
+
+def drain():
+    """This process's raw metrics, which are then cleared.
+
+    Pool workers return this to the parent, which passes it to merge(), so
+    work done in other processes shows up in the parent's exports.
+    """
+    with _lock:
+        ops = {
+            op: {name: getattr(stats, name) for name in _OpStats.__slots__}
+            for op, stats in _ops.items()
+        }
+        _ops.clear()
+    return ops
+
+
+def merge(ops):
+    """Add metrics from drain() (in another process) to this process's."""
+    with _lock:
+        for op, fields in ops.items():
+            stats = _ops.get(op)
+            if stats is None:
+                stats = _ops[op] = _OpStats()
+            for name, value in fields.items():
+                if name == "buckets":
+                    stats.buckets = [a + b for a, b in zip(stats.buckets, value)]
+                elif name == "peak_decoded":
+                    stats.peak_decoded = max(stats.peak_decoded, value)
+                else:
+                    setattr(stats, name, getattr(stats, name) + value)
+
+
+def snapshot():
+    """All metrics as a JSON-able dict keyed by op."""
+    with _lock:
+        ops = {}
+        for op, stats in sorted(_ops.items()):
+            cumulative, buckets = 0, {}
+            for bound, n in zip(BUCKETS, stats.buckets):
+                cumulative += n
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = stats.count
+            ops[op] = {
+                "count": stats.count,
+                "errors": stats.errors,
+                "seconds": stats.seconds,
+                "buckets": buckets,
+                "peak_decoded_bytes": stats.peak_decoded,
+                **{name: getattr(stats, name) for name in COUNTERS},
+            }
+        return {"time": time.time(), "pid": os.getpid(), "ops": ops}
+
+
+def write_snapshot(path):
+    with open(path, "w") as f:
+        json.dump(snapshot(), f, indent=1)
+
+
+def prometheus_text():
+    """All metrics in the Prometheus text exposition format."""
+    ops = snapshot()["ops"]
+    lines = [
+        f"# HELP {PREFIX}_op_seconds Time spent per operation.",
+        f"# TYPE {PREFIX}_op_seconds histogram",
+    ]
+    for op, m in ops.items():
+        for bound, n in m["buckets"].items():
+            lines.append(f'{PREFIX}_op_seconds_bucket{{op="{op}",le="{bound}"}} {n}')
+        lines.append(f'{PREFIX}_op_seconds_sum{{op="{op}"}} {m["seconds"]}')
+        lines.append(f'{PREFIX}_op_seconds_count{{op="{op}"}} {m["count"]}')
+
+    for name in ("errors",) + COUNTERS:
+        lines.append(f"# TYPE {PREFIX}_op_{name}_total counter")
+        for op, m in ops.items():
+            lines.append(f'{PREFIX}_op_{name}_total{{op="{op}"}} {m[name]}')
+    lines.append(f"# TYPE {PREFIX}_op_peak_decoded_bytes gauge")
+    for op, m in ops.items():
+        lines.append(
+            f'{PREFIX}_op_peak_decoded_bytes{{op="{op}"}} {m["peak_decoded_bytes"]}'
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,137 @@
+from PIL import Image, ImageDraw
+from collections import OrderedDict
+import math
+import threading
+
+
+def _split(shape):
+    # ("rectangle", xy, {"outline": "red"}) -> ("rectangle", (xy,), {...});
+    # the options dict is optional.
+    method, *args = shape
+    options = args.pop() if args and isinstance(args[-1], dict) else {}
+    return method, args, options
+
+
+def render_layer(spec, size):
+    """Draw spec onto a transparent size canvas.
+
+    spec is a sequence of (method, *args[, options]) tuples naming
+    ImageDraw methods, e.g. ("ellipse", xy, {"outline": "green"}) or
+    ("text", xy, "label", {"fill": "red", "font": font}). Returns the
+    layer cropped to what was drawn and its offset, or (None, None) if
+    nothing was.
+    """
+    layer = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(layer)
+    for shape in spec:
+        method, args, options = _split(shape)
+        getattr(draw, method)(*args, **options)
+    bbox = layer.getchannel("A").getbbox()
+    if bbox is None:
+        return None, None
+    return layer.crop(bbox), bbox[:2]
+
+
+class Overlay:
+    """Annotations drawn once and composited onto any number of images.
+
+    spec (see render_layer) is in the coordinates of an image of size.
+    The layer is rendered on first use and kept cropped to its bounding
+    box, so apply() only touches that region of each target. Targets of
+    other sizes get the layer rescaled to match, cached per size (up to
+    max_cached sizes).
+    """
+
+    def __init__(self, spec, size, max_cached=8):
+        self.spec = list(spec)
+        self.size = tuple(size)
+        self.max_cached = max_cached
+        self._layers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def layer(self, size=None):
+        """(layer, offset) for a target of size; layer is None if the
+        spec draws nothing."""
+        size = self.size if size is None else tuple(size)
+        with self._lock:
+            cached = self._layers.get(size)
+            if cached is not None:
+                self._layers.move_to_end(size)
+                return cached
+        if size == self.size:
+            cached = render_layer(self.spec, size)
+        else:
+            cached = self._scaled(*self.layer(), size)
+        with self._lock:
+            self._layers[size] = cached
+            while len(self._layers) > self.max_cached:
+                self._layers.popitem(last=False)
+        return cached
+
+    def _scaled(self, layer, offset, size):
+        if layer is None:
+            return None, None
+        sx = size[0] / self.size[0]
+        sy = size[1] / self.size[1]
+        left, top = round(offset[0] * sx), round(offset[1] * sy)
+        right = max(left + 1, round((offset[0] + layer.width) * sx))
+        bottom = max(top + 1, round((offset[1] + layer.height) * sy))
+        return layer.resize((right - left, bottom - top), Image.LANCZOS), (left, top)
+
+    def apply(self, target):
+        """Composite the overlay onto target in place; returns target."""
+        layer, offset = self.layer(target.size)
+        if layer is None:
+            return target
+        if target.mode == "RGBA":
+            target.alpha_composite(layer, offset)
+        else:
+            target.paste(layer, offset, layer)
+        return target
+
+
+# How far (in source pixels, at 1:1 or when enlarging) each filter reaches.
+_SUPPORT = {
+    Image.NEAREST: 1,
+    Image.BOX: 1,
+    Image.BILINEAR: 1,
+    Image.HAMMING: 1,
+    Image.BICUBIC: 2,
+    Image.LANCZOS: 3,
+}
+
+
+def composite_resized(background, overlay, resample=Image.BICUBIC):
+    """alpha_composite overlay, stretched to background's size, onto the
+    RGBA background in place; returns background.
+
+    Only the overlay's non-transparent bounding box (plus the filter's
+    reach) is resampled and composited, so a small watermark on a large
+    photo costs in proportion to the watermark.
+    """
+    if overlay.mode != "RGBA":
+        overlay = overlay.convert("RGBA")
+    bbox = overlay.getchannel("A").getbbox()
+    if bbox is None:
+        return background
+    if overlay.size == background.size:
+        background.alpha_composite(overlay, bbox[:2], bbox)
+        return background
+
+    # Scale factors, source pixels per destination pixel.
+    sx = overlay.width / background.width
+    sy = overlay.height / background.height
+    reach = _SUPPORT.get(resample, 3)
+    rx, ry = reach * max(sx, 1) + 1, reach * max(sy, 1) + 1
+    left = max(0, math.floor((bbox[0] - rx) / sx))
+    top = max(0, math.floor((bbox[1] - ry) / sy))
+    right = min(background.width, math.ceil((bbox[2] + rx) / sx))
+    bottom = min(background.height, math.ceil((bbox[3] + ry) / sy))
+    # Same sample positions as resizing the whole overlay, just fewer of them.
+    region = overlay.resize(
+        (right - left, bottom - top),
+        resample,
+        box=(left * sx, top * sy, right * sx, bottom * sy),
+    )
+    background.alpha_composite(region, (left, top))
+    return background
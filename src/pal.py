@@ -1,4 +1,6 @@
-from PIL import Image, ImageOps
+from PIL import Image
+from quantize import PaletteMapper, recolor
+import metrics
 import random
 import os
 
@@ -7,30 +9,49 @@ def replace_palette_with_random_colors(image_path):
     # Open the image
     img = Image.open(image_path)
 
-    # Convert image to 'P' mode (indexed color mode) if not already
-    img = ImageOps.posterize(img, 8)  # Reduce colors to 8-bit
-    img = img.convert("P", palette=Image.ADAPTIVE, colors=256)  # Convert to 'P' mode
+    with metrics.span("palette.replace") as s:
+        s.image_in(img)
 
-    # Get the palette
-    # palette = img.getpalette()
+        # Convert image to 'P' mode (indexed color mode) if not already
+        if img.mode != "P":
+            img = img.convert("P", palette=Image.ADAPTIVE, colors=256)
 
-    # Generate random colors
-    new_palette = []
-    for i in range(256):  # Assuming 256-color palette
-        new_color = (
-            random.randint(0, 255),
-            random.randint(0, 255),
-            random.randint(0, 255),
-        )
-        new_palette.extend(new_color)
+        # Generate random colors: 256 RGB triples in one call
+        new_palette = random.randbytes(256 * 3)
 
-    # Replace the image palette with the new random palette
-    img.putpalette(new_palette)
+        # Replace the image palette with the new random palette
+        img.putpalette(new_palette)
+        s.image_out(img)
 
     # Save the modified image
     img.save(os.path.join("img", "output_image_with_random_palette.png"))
     print("Image with random palette saved successfully.")
 
 
+def replace_palettes_with_random_colors(image_paths):
+    # Give a set of images the same random colors: build one palette for
+    # the whole set, map every image onto it (no per-image median cut),
+    # then swap in one random palette for all of them
+    images = [Image.open(path) for path in image_paths]
+
+    with metrics.span("palette.replace_many") as s:
+        mapper = PaletteMapper.from_images(images)
+        new_palette = random.randbytes(256 * 3)
+        outputs = []
+        for img in images:
+            s.image_in(img)
+            img = recolor(mapper.quantize(img), new_palette)
+            s.image_out(img)
+            outputs.append(img)
+
+    for path, img in zip(image_paths, outputs):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        img.save(os.path.join("img", stem + "_random_palette.png"))
+    print("Images with a shared random palette saved successfully.")
+
+
 # Example usage:
 replace_palette_with_random_colors(os.path.join("img", "hopper.ppm"))
+replace_palettes_with_random_colors(
+    [os.path.join("img", f"snorkle_{i}.png") for i in (1, 2, 3)]
+)
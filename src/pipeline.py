@@ -0,0 +1,447 @@
+from PIL import Image, ImageEnhance, ImageFilter
+from fractions import Fraction
+from functools import lru_cache
+import math
+import os
+
+T = Image.Transpose
+
+# Resampling filters without negative lobes: their output never leaves the
+# input range, so nothing is clipped and they commute with convert("L").
+NON_RINGING = (Image.NEAREST, Image.BOX, Image.BILINEAR)
+
+# Enhancers that only look at one pixel at a time.
+PER_PIXEL_ENHANCERS = (ImageEnhance.Brightness, ImageEnhance.Color)
+
+# convert() to these dithers by default, spreading each pixel's error onto
+# its neighbours, so a crop can't move ahead of it.
+DITHERED_MODES = ("1", "P", "PA")
+
+
+@lru_cache(maxsize=None)
+def _compose_transposes(first, second):
+    # Which single transpose (or None for identity) equals first then second?
+    # Worked out on a tiny probe image rather than by hand.
+    probe = Image.frombytes("L", (3, 2), bytes(range(6)))
+    target = probe.transpose(first).transpose(second)
+    for method in (None,) + tuple(T):
+        candidate = probe if method is None else probe.transpose(method)
+        if candidate.size == target.size and candidate.tobytes() == target.tobytes():
+            return method
+
+
+def _untranspose_box(method, box, size):
+    # The box in the source that transpose(method) moves onto box.
+    x0, y0, x1, y1 = box
+    w, h = size
+    return {
+        T.FLIP_LEFT_RIGHT: (w - x1, y0, w - x0, y1),
+        T.FLIP_TOP_BOTTOM: (x0, h - y1, x1, h - y0),
+        T.ROTATE_180: (w - x1, h - y1, w - x0, h - y0),
+        T.ROTATE_90: (w - y1, x0, w - y0, x1),
+        T.ROTATE_270: (y0, h - x1, y1, h - x0),
+        T.TRANSPOSE: (y0, x0, y1, x1),
+        T.TRANSVERSE: (w - y1, h - x1, w - y0, h - x0),
+    }[method]
+
+
+def _rotate_transpose(angle, size, expand):
+    # The transpose Image.rotate() takes as a shortcut for angle, "copy" for
+    # a plain copy, or None if it really resamples.
+    angle = angle % 360.0
+    if angle == 0:
+        return "copy"
+    if angle == 180:
+        return T.ROTATE_180
+    if angle in (90, 270) and (expand or size[0] == size[1]):
+        return T.ROTATE_90 if angle == 90 else T.ROTATE_270
+    return None
+
+
+def _rotated_size(size, angle):
+    # Same arithmetic as Image.rotate(expand=True), float for float.
+    method = _rotate_transpose(angle, size, True)
+    if method in (T.ROTATE_90, T.ROTATE_270):
+        return size[::-1]
+    if method is not None:
+        return size
+    w, h = size
+    a = -math.radians(angle % 360.0)
+    cos, sin = round(math.cos(a), 15), round(math.sin(a), 15)
+    c = cos * (-w / 2.0) + sin * (-h / 2.0) + w / 2.0
+    f = -sin * (-w / 2.0) + cos * (-h / 2.0) + h / 2.0
+    corners = ((0, 0), (w, 0), (w, h), (0, h))
+    xs = [cos * x + sin * y + c for x, y in corners]
+    ys = [-sin * x + cos * y + f for x, y in corners]
+    return (
+        math.ceil(max(xs)) - math.floor(min(xs)),
+        math.ceil(max(ys)) - math.floor(min(ys)),
+    )
+
+
+def _dyadic(value, max_denominator=1 << 16):
+    # True if value is a multiple of 1/2**k for a small k: arithmetic on such
+    # values, in doubles or in Pillow's 16.16 fixed point, is exact.
+    d = Fraction(value).denominator
+    return d <= max_denominator and d & (d - 1) == 0
+
+
+def _output(step, size, mode):
+    """(size, mode) after step, given the (size, mode) going in."""
+    op = step[0]
+    if op == "crop":
+        x0, y0, x1, y1 = step[1]
+        return (x1 - x0, y1 - y0), mode
+    if op in ("resize", "pad"):
+        return step[1], mode
+    if op == "reduce":
+        fx, fy = step[1]
+        x0, y0, x1, y1 = step[2] or (0, 0) + size
+        return (math.ceil((x1 - x0) / fx), math.ceil((y1 - y0) / fy)), mode
+    if op == "transpose":
+        swaps = step[1] in (T.ROTATE_90, T.ROTATE_270, T.TRANSPOSE, T.TRANSVERSE)
+        return (size[::-1] if swaps else size), mode
+    if op == "rotate":
+        return (_rotated_size(size, step[1]) if step[3] else size), mode
+    if op == "convert":
+        return size, step[1]
+    return size, mode
+
+
+def _linear_filter(f):
+    # Filters whose output is a weighted average of inputs, which never clip.
+    if isinstance(f, (ImageFilter.GaussianBlur, ImageFilter.BoxBlur)):
+        return True
+    if isinstance(f, ImageFilter.Kernel):
+        _, scale, offset, kernel = f.filterargs
+        return offset == 0 and min(kernel) >= 0 and sum(kernel) <= scale
+    return False
+
+
+class Pipeline:
+    """A chain of transforms recorded now and run later, after rewriting.
+
+    Pipeline(src).crop(...).resize(...).convert("L").save(...) records each
+    operation instead of running it; source is a path (opened lazily, so
+    only its header is read until run()) or an Image. Before anything runs
+    the chain is rewritten to touch fewer pixels:
+
+    - crops move ahead of transposes, per-pixel ops and resizes (folding
+      into resize(box=...)), so later steps work on the smaller region;
+      converts to "1" and "P" dither, so crops stay behind those;
+    - consecutive transposes, and rotations by multiples of 90 degrees,
+      collapse into a single transpose or disappear;
+    - convert("L") on an RGB image moves ahead of geometry, averaging
+      filters and enhancers, which then run on one band instead of three;
+    - BOX resizes by an integer factor become reduce().
+
+    Results match running the steps as written, up to rounding where
+    convert("L") moves; a crop only folds into a resize when the sample
+    positions come out bit-for-bit the same. With
+    exact=False the pipeline also lets JPEG sources decode at reduced
+    scale (draft), resizes go through reduce() first (reducing_gap), and
+    convert("L") moves past any filter or enhancer, even where that changes
+    how values clip.
+    """
+
+    def __init__(self, source, exact=True, _steps=()):
+        self.source = source
+        self.exact = exact
+        self._steps = tuple(_steps)
+        if isinstance(source, Image.Image):
+            self._size, self._mode = source.size, source.mode
+        else:
+            with Image.open(source) as im:
+                self._size, self._mode = im.size, im.mode
+
+    def _then(self, *step):
+        return Pipeline(self.source, self.exact, self._steps + (step,))
+
+    @property
+    def size(self):
+        return self._trace(self._steps)[-1][0]
+
+    @property
+    def mode(self):
+        return self._trace(self._steps)[-1][1]
+
+    def _trace(self, steps):
+        states = [(self._size, self._mode)]
+        for step in steps:
+            states.append(_output(step, *states[-1]))
+        return states
+
+    # Recording.
+
+    def crop(self, box):
+        return self._then("crop", tuple(box))
+
+    # A box of None means the whole image, whatever size it turns out to be
+    # when the step runs.
+
+    def resize(self, size, resample=Image.BICUBIC, box=None):
+        box = None if box is None else tuple(box)
+        return self._then("resize", tuple(size), resample, box)
+
+    def reduce(self, factor, box=None):
+        if isinstance(factor, int):
+            factor = (factor, factor)
+        box = None if box is None else tuple(box)
+        return self._then("reduce", tuple(factor), box)
+
+    def transpose(self, method):
+        return self._then("transpose", method)
+
+    def rotate(self, angle, resample=Image.NEAREST, expand=False, fillcolor=None):
+        return self._then("rotate", angle, resample, expand, fillcolor)
+
+    def convert(self, mode):
+        return self._then("convert", mode)
+
+    def filter(self, f):
+        if isinstance(f, type):
+            f = f()
+        return self._then("filter", f)
+
+    def enhance(self, enhancer, factor):
+        """enhancer is an ImageEnhance class, e.g. ImageEnhance.Contrast."""
+        return self._then("enhance", enhancer, factor)
+
+    # ImageOps equivalents, expressed as the resizes they perform.
+
+    def contain(self, size, method=Image.BICUBIC):
+        return self.resize(self._contain_size(size), method)
+
+    def cover(self, size, method=Image.BICUBIC):
+        w, h = self.size
+        if w / h < size[0] / size[1]:
+            size = (size[0], round(h / w * size[0]))
+        elif w / h > size[0] / size[1]:
+            size = (round(w / h * size[1]), size[1])
+        return self.resize(size, method)
+
+    def fit(self, size, method=Image.BICUBIC, centering=(0.5, 0.5)):
+        w, h = self.size
+        if w / h >= size[0] / size[1]:
+            crop_w, crop_h = size[0] / size[1] * h, h
+        else:
+            crop_w, crop_h = w, w / (size[0] / size[1])
+        left = (w - crop_w) * centering[0]
+        top = (h - crop_h) * centering[1]
+        return self.resize(size, method, (left, top, left + crop_w, top + crop_h))
+
+    def pad(self, size, method=Image.BICUBIC, color=None, centering=(0.5, 0.5)):
+        inner = self._contain_size(size)
+        out = self.resize(inner, method)
+        if inner == tuple(size):
+            return out
+        offset = (
+            round((size[0] - inner[0]) * centering[0]),
+            round((size[1] - inner[1]) * centering[1]),
+        )
+        return out._then("pad", tuple(size), color, offset)
+
+    def _contain_size(self, size):
+        w, h = self.size
+        if w / h > size[0] / size[1]:
+            return size[0], round(h / w * size[0])
+        if w / h < size[0] / size[1]:
+            return round(w / h * size[1]), size[1]
+        return tuple(size)
+
+    # Optimizing.
+
+    def steps(self):
+        """The rewritten steps, as (operation, *arguments) tuples."""
+        steps = list(self._steps)
+        while self._rewrite(steps):
+            pass
+        states = self._trace(steps)
+        return [self._lower(step, state[0]) for step, state in zip(steps, states)]
+
+    def _rewrite(self, steps):
+        # Apply the first rewrite that matches; True if anything changed.
+        states = self._trace(steps)
+        for i, step in enumerate(steps):
+            size, mode = states[i]
+            prev = steps[i - 1] if i else None
+            prev_size = states[i - 1][0] if i else None
+
+            if step[0] == "rotate":
+                # The same shortcuts Image.rotate() takes.
+                method = _rotate_transpose(step[1], size, step[3])
+                if method is not None:
+                    steps[i : i + 1] = (
+                        [] if method == "copy" else [("transpose", method)]
+                    )
+                    return True
+
+            if step[0] == "convert" and step[1] == mode:
+                del steps[i]
+                return True
+
+            if prev is None:
+                continue
+
+            if step[0] == "transpose" and prev[0] == "transpose":
+                method = _compose_transposes(prev[1], step[1])
+                steps[i - 1 : i + 1] = [] if method is None else [("transpose", method)]
+                return True
+
+            if step[0] == "crop" and self._within(step[1], size):
+                box = step[1]
+                if prev[0] == "crop":
+                    x, y = prev[1][:2]
+                    box = (box[0] + x, box[1] + y, box[2] + x, box[3] + y)
+                    steps[i - 1 : i + 1] = [("crop", box)]
+                    return True
+                if prev[0] == "resize":
+                    bx0, by0, bx1, by1 = prev[3] or (0, 0) + prev_size
+                    sx = (bx1 - bx0) / prev[1][0]
+                    sy = (by1 - by0) / prev[1][1]
+                    # Folded, every sample position is computed from a
+                    # different origin. Pillow rounds those positions to
+                    # whole source pixels (NEAREST, BOX) or window edges,
+                    # so only fold when the arithmetic is exact, unless
+                    # exact=False.
+                    if self.exact and not all(map(_dyadic, (bx0, by0, sx, sy))):
+                        continue
+                    region = (
+                        bx0 + box[0] * sx,
+                        by0 + box[1] * sy,
+                        bx0 + box[2] * sx,
+                        by0 + box[3] * sy,
+                    )
+                    crop_size = (box[2] - box[0], box[3] - box[1])
+                    steps[i - 1 : i + 1] = [("resize", crop_size, prev[2], region)]
+                    return True
+                if prev[0] == "transpose":
+                    source_box = _untranspose_box(prev[1], box, prev_size)
+                    steps[i - 1 : i + 1] = [("crop", source_box), prev]
+                    return True
+                if (prev[0] == "convert" and prev[1] not in DITHERED_MODES) or (
+                    prev[0] == "enhance" and prev[1] in PER_PIXEL_ENHANCERS
+                ):
+                    steps[i - 1 : i + 1] = [step, prev]
+                    return True
+
+            if step[0] == "convert" and step[1] == "L" and mode == "RGB":
+                if (
+                    prev[0] == "enhance"
+                    and prev[1] is ImageEnhance.Color
+                    and (not self.exact or 0 <= prev[2] <= 1)
+                ):
+                    # Color only moves pixels toward their own grey value
+                    # (beyond 1 it pushes them away, and clips).
+                    del steps[i - 1]
+                    return True
+                if self._commutes_with_grey(prev):
+                    steps[i - 1 : i + 1] = [step, prev]
+                    return True
+        return False
+
+    @staticmethod
+    def _within(box, size):
+        return 0 <= box[0] <= box[2] <= size[0] and 0 <= box[1] <= box[3] <= size[1]
+
+    def _commutes_with_grey(self, step):
+        op = step[0]
+        if op in ("transpose", "reduce"):
+            return True
+        if op == "resize":
+            return not self.exact or step[2] in NON_RINGING
+        if op == "rotate":
+            return step[4] is None and (not self.exact or step[2] in NON_RINGING)
+        if op == "filter":
+            return not self.exact or _linear_filter(step[1])
+        if op == "enhance":
+            return not self.exact or 0 <= step[2] <= 1
+        return False
+
+    def _lower(self, step, size_in):
+        # Integer BOX downscales are exactly what reduce() computes.
+        if step[0] == "resize" and step[2] == Image.BOX:
+            size, box = step[1], step[3] or (0, 0) + size_in
+            if all(float(v).is_integer() for v in box):
+                box = tuple(int(v) for v in box)
+                fx = (box[2] - box[0]) / size[0]
+                fy = (box[3] - box[1]) / size[1]
+                if fx.is_integer() and fy.is_integer() and max(fx, fy) > 1:
+                    return ("reduce", (int(fx), int(fy)), box)
+        return step
+
+    # Running.
+
+    def run(self):
+        """Run the rewritten steps and return the result."""
+        steps = self.steps()
+        if isinstance(self.source, Image.Image):
+            return self._run(self.source, steps)
+        with Image.open(self.source) as im:
+            if not self.exact and im.format == "JPEG":
+                steps = self._draft(im, steps)
+            return self._run(im, steps)
+
+    def _draft(self, im, steps):
+        # Let libjpeg scale by 1/2, 1/4 or 1/8 while decoding when the
+        # pipeline starts by shrinking the image anyway.
+        mode = im.mode
+        first = 0
+        if steps and steps[0] == ("convert", "L"):
+            mode, first = "L", 1
+        if len(steps) <= first or steps[first][0] != "resize":
+            return steps
+        _, size, resample, box = steps[first]
+        w, h = im.size
+        box = box or (0, 0, w, h)
+        want = (
+            math.ceil(size[0] * w / (box[2] - box[0])),
+            math.ceil(size[1] * h / (box[3] - box[1])),
+        )
+        im.draft(mode, want)
+        sx, sy = im.width / w, im.height / h
+        box = (box[0] * sx, box[1] * sy, box[2] * sx, box[3] * sy)
+        return steps[:first] + [("resize", size, resample, box)] + steps[first + 1 :]
+
+    def _run(self, im, steps):
+        source = im
+        reducing_gap = None if self.exact else 2.0
+        for step in steps:
+            op = step[0]
+            if op == "crop":
+                im = im.crop(step[1])
+            elif op == "resize":
+                im = im.resize(step[1], step[2], step[3], reducing_gap)
+            elif op == "reduce":
+                im = im.reduce(step[1], step[2])
+            elif op == "transpose":
+                im = im.transpose(step[1])
+            elif op == "rotate":
+                _, angle, resample, expand, fillcolor = step
+                im = im.rotate(angle, resample, expand, fillcolor=fillcolor)
+            elif op == "convert":
+                im = im.convert(step[1])
+            elif op == "filter":
+                im = im.filter(step[1])
+            elif op == "enhance":
+                im = step[1](im).enhance(step[2])
+            elif op == "pad":
+                out = Image.new(im.mode, step[1], step[2])
+                out.paste(im, step[3])
+                im = out
+        if im is source:
+            im = im.copy()
+        return im
+
+    def save(self, fp, format=None, **params):
+        """Run the pipeline and save the result. Returns the image."""
+        im = self.run()
+        im.save(fp, format, **params)
+        return im
+
+    def __repr__(self):
+        source = self.source
+        if isinstance(source, (str, os.PathLike)):
+            source = os.fspath(source)
+        ops = "".join(f".{step[0]}{step[1:]!r}" for step in self._steps)
+        return f"Pipeline({source!r}){ops}"
@@ -0,0 +1,309 @@
+from PIL import Image, ImageMode
+import operator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Expr:
+    """A per-pixel expression over image bands.
+
+    Build them from the band names below (R, G, B, ...) with arithmetic,
+    comparisons, & and |, and where()/clip(). Nothing is evaluated until a
+    PointProgram compiles the expressions into lookup tables.
+    """
+
+    def __add__(self, other):
+        return Op("add", self, other)
+
+    def __radd__(self, other):
+        return Op("add", other, self)
+
+    def __sub__(self, other):
+        return Op("sub", self, other)
+
+    def __rsub__(self, other):
+        return Op("sub", other, self)
+
+    def __mul__(self, other):
+        return Op("mul", self, other)
+
+    def __rmul__(self, other):
+        return Op("mul", other, self)
+
+    def __truediv__(self, other):
+        return Op("truediv", self, other)
+
+    def __rtruediv__(self, other):
+        return Op("truediv", other, self)
+
+    def __neg__(self):
+        return Op("sub", 0, self)
+
+    def __lt__(self, other):
+        return Op("lt", self, other)
+
+    def __le__(self, other):
+        return Op("le", self, other)
+
+    def __gt__(self, other):
+        return Op("gt", self, other)
+
+    def __ge__(self, other):
+        return Op("ge", self, other)
+
+    def __and__(self, other):
+        return Op("and_", self, other)
+
+    def __or__(self, other):
+        return Op("or_", self, other)
+
+
+class Band(Expr):
+    def __init__(self, name):
+        self.name = name
+
+    def bands(self):
+        return {self.name}
+
+    def evaluate(self, env, vectorized=False):
+        return env[self.name]
+
+    def substitute(self, mapping):
+        return mapping.get(self.name, self)
+
+    def __repr__(self):
+        return self.name
+
+
+class Op(Expr):
+    # name -> (scalar implementation, NumPy implementation)
+    OPS = {
+        "add": (operator.add, operator.add),
+        "sub": (operator.sub, operator.sub),
+        "mul": (operator.mul, operator.mul),
+        "truediv": (operator.truediv, operator.truediv),
+        "lt": (operator.lt, operator.lt),
+        "le": (operator.le, operator.le),
+        "gt": (operator.gt, operator.gt),
+        "ge": (operator.ge, operator.ge),
+        "and_": (lambda a, b: bool(a) and bool(b), operator.and_),
+        "or_": (lambda a, b: bool(a) or bool(b), operator.or_),
+        "min": (min, lambda a, b: np.minimum(a, b)),
+        "max": (max, lambda a, b: np.maximum(a, b)),
+        "where": (lambda c, a, b: a if c else b, lambda c, a, b: np.where(c, a, b)),
+        "byte": (
+            lambda a: _to_byte(a),
+            lambda a: np.clip(np.rint(a), 0, 255),
+        ),
+    }
+
+    def __init__(self, name, *args):
+        self.name = name
+        self.args = args
+
+    def bands(self):
+        found = set()
+        for arg in self.args:
+            if isinstance(arg, Expr):
+                found |= arg.bands()
+        return found
+
+    def evaluate(self, env, vectorized=False):
+        fn = self.OPS[self.name][1 if vectorized else 0]
+        return fn(*(_evaluate(arg, env, vectorized) for arg in self.args))
+
+    def substitute(self, mapping):
+        args = [a.substitute(mapping) if isinstance(a, Expr) else a for a in self.args]
+        return Op(self.name, *args)
+
+    def __repr__(self):
+        return f"{self.name}({', '.join(map(repr, self.args))})"
+
+
+def where(cond, a, b):
+    return Op("where", cond, a, b)
+
+
+def clip(x, lo=0, hi=255):
+    return Op("min", Op("max", x, lo), hi)
+
+
+R, G, B, A, L = Band("R"), Band("G"), Band("B"), Band("A"), Band("L")
+# Stands for "the band being computed" in expressions applied to every band.
+X = Band("X")
+
+
+def _to_byte(v):
+    # Same rounding (half to even) and clamping Image.point applies to a
+    # function's results.
+    return min(max(round(v), 0), 255)
+
+
+def _evaluate(expr, env, vectorized=False):
+    if isinstance(expr, Expr):
+        return expr.evaluate(env, vectorized)
+    return expr
+
+
+def _table(expr, band=None):
+    """Evaluate a single-band (or constant) expression for all 256 inputs."""
+    return [_evaluate(expr, {band: v}) for v in range(256)]
+
+
+def _lift_where(expr):
+    # f(where(c, a, b)) == where(c, f(a), f(b)): hoisting conditionals to
+    # the top lets fused chains still compile to the cheap where() plan.
+    if not isinstance(expr, Op):
+        return expr
+    args = [_lift_where(arg) for arg in expr.args]
+    if expr.name != "where":
+        for i, arg in enumerate(args):
+            if isinstance(arg, Op) and arg.name == "where":
+                cond, a, b = arg.args
+                branch_a = Op(expr.name, *args[:i], a, *args[i + 1 :])
+                branch_b = Op(expr.name, *args[:i], b, *args[i + 1 :])
+                return where(cond, _lift_where(branch_a), _lift_where(branch_b))
+    return Op(expr.name, *args)
+
+
+class PointProgram:
+    """Per-band expressions compiled down to as few image passes as possible.
+
+    exprs maps band names to expressions (bands left out pass through), or
+    is a single expression in X applied to every band. Compilation folds
+    each band down to one of:
+
+    - a lookup table on one source band; if every band is a table on
+      itself, the whole program is one Image.point() call;
+    - where(cond, a, b) with cond on one band and a/b on another, run as
+      three small point()s and one composite();
+    - anything else, which needs the NumPy backend.
+
+    then() substitutes one program into another, so chains of point ops
+    fuse into a single table per band before anything runs.
+    """
+
+    def __init__(self, exprs, mode="RGB"):
+        self.mode = mode
+        self.band_names = ImageMode.getmode(mode).bands
+        if isinstance(exprs, Expr):
+            exprs = {
+                name: exprs.substitute({"X": Band(name)}) for name in self.band_names
+            }
+        unknown = set(exprs) - set(self.band_names)
+        if unknown:
+            raise ValueError(f"mode {mode} has no band(s) {sorted(unknown)}")
+        self.exprs = {name: exprs.get(name, Band(name)) for name in self.band_names}
+        self.plan = [self._compile(name) for name in self.band_names]
+
+    def then(self, other):
+        """The program that runs self, then other, compiled as one.
+
+        self's results are rounded to bytes before other sees them, exactly
+        as if the two ran as separate point() passes.
+        """
+        if isinstance(other, (Expr, dict)):
+            other = PointProgram(other, self.mode)
+        stage = {name: Op("byte", expr) for name, expr in self.exprs.items()}
+        exprs = {
+            name: (
+                other.exprs[name].substitute(stage)
+                if isinstance(other.exprs[name], Expr)
+                else other.exprs[name]
+            )
+            for name in self.band_names
+        }
+        return PointProgram(exprs, self.mode)
+
+    def _compile(self, name):
+        expr = _lift_where(self.exprs[name])
+        deps = expr.bands() if isinstance(expr, Expr) else set()
+        if len(deps) <= 1:
+            source = deps.pop() if deps else name
+            return ("lut", source, [_to_byte(v) for v in _table(expr, source)])
+        if isinstance(expr, Op) and expr.name == "where":
+            cond, a, b = expr.args
+            cond_deps = cond.bands() if isinstance(cond, Expr) else set()
+            value_deps = set()
+            for arg in (a, b):
+                if isinstance(arg, Expr):
+                    value_deps |= arg.bands()
+            if len(cond_deps) == 1 and len(value_deps) <= 1:
+                x = cond_deps.pop()
+                y = value_deps.pop() if value_deps else name
+                mask = [255 if v else 0 for v in _table(cond, x)]
+                a_lut = [_to_byte(v) for v in _table(a, y)]
+                b_lut = [_to_byte(v) for v in _table(b, y)]
+                return ("where", x, mask, y, a_lut, b_lut)
+        return ("general", expr)
+
+    def passes(self):
+        """How the program will run with the Pillow backend, for inspection."""
+        return [step[0] for step in self.plan]
+
+    def apply(self, im, backend="pillow"):
+        if im.mode != self.mode:
+            raise ValueError(f"program compiled for {self.mode}, got {im.mode}")
+        if backend == "numpy" or any(step[0] == "general" for step in self.plan):
+            if np is None:
+                raise ImportError("this program needs numpy")
+            return self._apply_numpy(im)
+        return self._apply_pillow(im)
+
+    def _apply_pillow(self, im):
+        identity = list(range(256))
+        names = self.band_names
+        if all(
+            step[0] == "lut" and step[1] == name for step, name in zip(self.plan, names)
+        ):
+            # The common case: one pass over the whole image.
+            return im.point([v for step in self.plan for v in step[2]])
+
+        bands = dict(zip(names, im.split()))
+
+        def table(band, lut):
+            return bands[band] if lut == identity else bands[band].point(lut)
+
+        out = []
+        for step in self.plan:
+            if step[0] == "lut":
+                out.append(table(step[1], step[2]))
+            else:
+                _, x, mask, y, a_lut, b_lut = step
+                out.append(
+                    Image.composite(
+                        table(y, a_lut), table(y, b_lut), bands[x].point(mask)
+                    )
+                )
+        return Image.merge(self.mode, out)
+
+    def _apply_numpy(self, im):
+        arr = np.asarray(im)
+        planes = {name: arr[..., i] for i, name in enumerate(self.band_names)}
+        if arr.ndim == 2:
+            planes = {self.band_names[0]: arr}
+        out = []
+        for step, name in zip(self.plan, self.band_names):
+            if step[0] == "lut":
+                out.append(np.asarray(step[2], np.uint8)[planes[step[1]]])
+            elif step[0] == "where":
+                _, x, mask, y, a_lut, b_lut = step
+                values = planes[y]
+                out.append(
+                    np.where(
+                        np.asarray(mask, bool)[planes[x]],
+                        np.asarray(a_lut, np.uint8)[values],
+                        np.asarray(b_lut, np.uint8)[values],
+                    )
+                )
+            else:
+                # float64, so products round exactly as Python's floats do.
+                env = {k: v.astype(np.float64) for k, v in planes.items()}
+                result = _evaluate(step[1], env, vectorized=True)
+                out.append(np.clip(np.rint(result), 0, 255).astype(np.uint8))
+        if len(out) == 1:
+            return Image.fromarray(out[0], self.mode)
+        return Image.fromarray(np.stack(out, axis=-1), self.mode)
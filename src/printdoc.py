@@ -0,0 +1,302 @@
+from PIL import Image, PSDraw
+from bounded import bounded_submit
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from thumbnail import fit_size
+import io
+import math
+import time
+
+A4 = (595, 842)  # in points
+LETTER = (612, 792)
+
+CAPTION_FONT = "Helvetica"
+
+# Helvetica advance widths (1/1000 em) for " " through "~"; anything else
+# is taken to be as wide as a digit.
+_HELVETICA = (
+    "278 278 355 556 556 889 667 191 333 333 389 584 278 333 278 278 556 556 "
+    "556 556 556 556 556 556 556 556 278 278 584 584 584 556 1015 667 667 722 "
+    "722 667 611 778 722 278 500 667 556 833 722 778 667 778 722 667 611 722 "
+    "667 944 667 667 611 278 278 278 469 556 333 556 556 500 556 556 278 556 "
+    "556 222 222 500 222 833 556 556 556 556 333 500 278 556 500 722 500 500 "
+    "500 334 260 334 584"
+)
+_WIDTHS = dict(zip(map(chr, range(32, 127)), map(int, _HELVETICA.split())))
+
+
+def text_width(text, font_size):
+    """Width in points of text set in Helvetica at font_size."""
+    return sum(_WIDTHS.get(c, 556) for c in text) * font_size / 1000
+
+
+# What a worker hands back for one page: data is the image, already
+# downsampled, as a PostScript snippet (PS) or JPEG bytes (PDF); box is
+# where it goes on the page, (x, y, width, height) in points, and
+# caption_xy where the caption's baseline starts.
+PreparedPage = namedtuple(
+    "PreparedPage", ["data", "pixel_size", "mode", "box", "caption", "caption_xy"]
+)
+
+
+def _layout(page_size, margin, caption_size, caption):
+    # Caption centered under the top margin, image box below it, in
+    # PostScript/PDF coordinates (origin at the bottom left).
+    width, height = page_size
+    top = height - margin
+    caption_xy = None
+    if caption:
+        caption_xy = (
+            (width - text_width(caption, caption_size)) / 2,
+            top - caption_size,
+        )
+        top -= caption_size * 2
+    return (margin, margin, width - 2 * margin, top - margin), caption_xy
+
+
+def _fit(pixel_size, dpi, box):
+    # Where an image of pixel_size, printed at dpi, lands in box: never
+    # bigger than the box, centered in it.
+    x, y, box_w, box_h = box
+    w = pixel_size[0] * 72 / dpi
+    h = pixel_size[1] * 72 / dpi
+    scale = min(1, box_w / w, box_h / h)
+    w, h = w * scale, h * scale
+    return x + (box_w - w) / 2, y + (box_h - h) / 2, w, h
+
+
+def prepare_page(
+    source,
+    caption="",
+    format="PDF",
+    page_size=A4,
+    margin=36,
+    dpi=150,
+    caption_size=18,
+    quality=85,
+):
+    """Decode, downsample and encode one page's image.
+
+    The image is shrunk to what its box holds at dpi (with JPEG draft
+    mode where possible), so nothing bigger than will print is embedded.
+    source is a path or an Image. This is what the process pool runs.
+    """
+    if not isinstance(source, Image.Image):
+        with Image.open(source) as im:
+            return prepare_page(
+                im, caption, format, page_size, margin, dpi, caption_size, quality
+            )
+
+    box, caption_xy = _layout(page_size, margin, caption_size, caption)
+    target = (
+        max(1, math.ceil(box[2] * dpi / 72)),
+        max(1, math.ceil(box[3] * dpi / 72)),
+    )
+    im = source
+    size = fit_size(im.size, target)
+    if size != im.size:
+        # No-op unless im is a JPEG that hasn't been decoded yet.
+        im.draft(im.mode, size)
+        im = im.resize(size, Image.LANCZOS, reducing_gap=2.0)
+    if im.mode not in ("L", "RGB"):
+        grey = im.mode in ("1", "LA", "I", "I;16", "F")
+        im = im.convert("L" if grey else "RGB")
+
+    placed = _fit(im.size, dpi, box)
+    out = io.BytesIO()
+    if format == "PS":
+        x, y, w, h = placed
+        PSDraw.PSDraw(out).image((x, y, x + w, y + h), im, dpi)
+    else:
+        im.save(out, "JPEG", quality=quality)
+    return PreparedPage(out.getvalue(), im.size, im.mode, placed, caption, caption_xy)
+
+
+def _text_bytes(text):
+    data = text.encode("latin-1", "replace")
+    for char in (b"\\", b"(", b")"):
+        data = data.replace(char, b"\\" + char)
+    return data
+
+
+class _PSWriter:
+    def __init__(self, fp, page_size, title):
+        self.fp = fp
+        self.page_size = page_size
+        self.pages = 0
+        fp.write(b"%!PS-Adobe-3.0\n")
+        fp.write(b"%%Title: " + _text_bytes(title or "") + b"\n")
+        fp.write(b"%%%%BoundingBox: 0 0 %d %d\n" % page_size)
+        fp.write(b"%%Pages: (atend)\n%%EndComments\n%%BeginProlog\n")
+        fp.write(PSDraw.EDROFF_PS)
+        fp.write(PSDraw.VDI_PS)
+        fp.write(b"%%EndProlog\n")
+
+    def page(self, prepared, caption_size):
+        self.pages += 1
+        self.fp.write(b"%%%%Page: %d %d\nsave\n" % (self.pages, self.pages))
+        self.fp.write(prepared.data)
+        if prepared.caption:
+            # Each page re-encodes its font, so pages stay independent.
+            ps = PSDraw.PSDraw(self.fp)
+            ps.isofont = {}
+            ps.setfont(CAPTION_FONT, caption_size)
+            x, y = prepared.caption_xy
+            self.fp.write(b"%f %f M (%s) S\n" % (x, y, _text_bytes(prepared.caption)))
+        self.fp.write(b"restore\nshowpage\n")
+
+    def close(self):
+        self.fp.write(b"%%%%Trailer\n%%%%Pages: %d\n%%%%EOF\n" % self.pages)
+
+
+class _PDFWriter:
+    # Objects are written as pages arrive; only their offsets are kept. The
+    # page tree (object 2) is written last, once the page count is known.
+
+    def __init__(self, fp, page_size, title):
+        self.fp = fp
+        self.page_size = page_size
+        self.offset = 0
+        self.offsets = {}
+        self.kids = []
+        self.pages = 0
+        self.title = title
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._object(
+            3,
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /%s"
+            b" /Encoding /WinAnsiEncoding >>" % CAPTION_FONT.encode(),
+        )
+        self.next_id = 4
+
+    def _write(self, data):
+        self.fp.write(data)
+        self.offset += len(data)
+
+    def _object(self, number, body, stream=None):
+        self.offsets[number] = self.offset
+        self._write(b"%d 0 obj\n" % number + body)
+        if stream is not None:
+            self._write(b"\nstream\n")
+            self._write(stream)
+            self._write(b"\nendstream")
+        self._write(b"\nendobj\n")
+
+    def page(self, prepared, caption_size):
+        image_id, content_id, page_id = range(self.next_id, self.next_id + 3)
+        self.next_id += 3
+        colorspace = b"/DeviceRGB" if prepared.mode == "RGB" else b"/DeviceGray"
+        self._object(
+            image_id,
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d"
+            b" /ColorSpace %s /BitsPerComponent 8 /Filter /DCTDecode"
+            b" /Length %d >>" % (*prepared.pixel_size, colorspace, len(prepared.data)),
+            prepared.data,
+        )
+
+        x, y, w, h = prepared.box
+        content = b"q %f 0 0 %f %f %f cm /Im0 Do Q\n" % (w, h, x, y)
+        if prepared.caption:
+            tx, ty = prepared.caption_xy
+            content += b"BT /F1 %d Tf %f %f Td (%s) Tj ET\n" % (
+                caption_size,
+                tx,
+                ty,
+                _text_bytes(prepared.caption),
+            )
+        self._object(content_id, b"<< /Length %d >>" % len(content), content)
+
+        self._object(
+            page_id,
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d]"
+            b" /Resources << /Font << /F1 3 0 R >> /XObject << /Im0 %d 0 R >> >>"
+            b" /Contents %d 0 R >>" % (*self.page_size, image_id, content_id),
+        )
+        self.kids.append(page_id)
+        self.pages += 1
+
+    def close(self):
+        kids = b" ".join(b"%d 0 R" % kid for kid in self.kids)
+        self._object(
+            2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.kids))
+        )
+        info_id = self.next_id
+        self._object(info_id, b"<< /Title (%s) >>" % _text_bytes(self.title or ""))
+
+        xref = self.offset
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % (info_id + 1))
+        for number in range(1, info_id + 1):
+            self._write(b"%010d 00000 n \n" % self.offsets[number])
+        self._write(
+            b"trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (info_id + 1, info_id, xref)
+        )
+
+
+def _pages(items):
+    for item in items:
+        if isinstance(item, (tuple, list)):
+            yield item[0], item[1]
+        else:
+            yield item, ""
+
+
+def write_document(
+    dest_path,
+    pages,
+    format=None,
+    page_size=A4,
+    margin=36,
+    dpi=150,
+    caption_size=18,
+    quality=85,
+    title=None,
+    workers=None,
+    max_pending=None,
+    executor=None,
+):
+    """Write pages, an iterable of sources or (source, caption) pairs, to
+    dest_path as a multi-page PostScript or PDF document.
+
+    format is "PS" or "PDF" (default: from dest_path's extension). Pages
+    are decoded and downsampled to dpi on a process pool (or executor),
+    queued through bounded_submit at most max_pending ahead of the writer,
+    and written in order one at a time, so neither the page list nor the
+    finished pages are ever all in memory. workers=1 does everything
+    inline. Returns a summary dict.
+    """
+    if format is None:
+        format = "PS" if dest_path.lower().endswith((".ps", ".eps")) else "PDF"
+    format = format.upper()
+    if format not in ("PS", "PDF"):
+        raise ValueError(f"format must be PS or PDF, not {format!r}")
+    options = (format, page_size, margin, dpi, caption_size, quality)
+    start = time.perf_counter()
+
+    with open(dest_path, "wb") as fp:
+        writer_class = _PSWriter if format == "PS" else _PDFWriter
+        writer = writer_class(fp, page_size, title)
+        if workers == 1 and executor is None:
+            for source, caption in _pages(pages):
+                writer.page(prepare_page(source, caption, *options), caption_size)
+        else:
+            calls = ((source, caption) + options for source, caption in _pages(pages))
+            done = bounded_submit(
+                prepare_page, calls, workers, max_pending, executor, ProcessPoolExecutor
+            )
+            with closing(done):
+                for _, future in done:
+                    writer.page(future.result(), caption_size)
+        writer.close()
+        size = fp.tell()
+
+    seconds = time.perf_counter() - start
+    return {
+        "format": format,
+        "pages": writer.pages,
+        "bytes": size,
+        "seconds": seconds,
+        "pages_per_second": writer.pages / seconds if seconds else 0.0,
+    }
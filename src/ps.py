@@ -1,53 +1,74 @@
 from PIL import Image, PSDraw
+from printdoc import write_document
+import glob
 import os
 
-# Define the PostScript file
-ps_file = open("hopper.ps", "wb")
 
-# Create a PSDraw object
-ps = PSDraw.PSDraw(ps_file)
+def print_hopper(path="hopper.ps"):
+    """The single page from the Pillow tutorial: hopper and a title."""
+    # Define the PostScript file
+    ps_file = open(path, "wb")
 
-# Start the document
-ps.begin_document()
+    # Create a PSDraw object
+    ps = PSDraw.PSDraw(ps_file)
 
-# Set the text to be drawn
-text = "Hopper"
+    # Start the document
+    ps.begin_document()
 
-# Define the PostScript font
-font_name = "Helvetica-Narrow-Bold"
-font_size = 36
+    # Set the text to be drawn
+    text = "Hopper"
 
-# Calculate text size (approximation as PSDraw doesn't provide direct method)
-# Assuming average character width as 0.6 of the font size
-text_width = len(text) * font_size * 0.6
-text_height = font_size
+    # Define the PostScript font
+    font_name = "Helvetica-Narrow-Bold"
+    font_size = 36
 
-# Set the position (top-center)
-page_width, page_height = 595, 842  # A4 size in points
-text_x = (page_width - text_width) // 2
-text_y = page_height - text_height - 50  # Distance from the top of the page
+    # Calculate text size (approximation as PSDraw doesn't provide direct method)
+    # Assuming average character width as 0.6 of the font size
+    text_width = len(text) * font_size * 0.6
+    text_height = font_size
 
-# Load the image
-image_path = os.path.join("img", "hopper.ppm")  # Update this with your image path
-with Image.open(image_path) as im:
-    # Resize the image if it's too large
-    im.thumbnail((page_width - 100, page_height // 2))
+    # Set the position (top-center)
+    page_width, page_height = 595, 842  # A4 size in points
+    text_x = (page_width - text_width) // 2
+    text_y = page_height - text_height - 50  # Distance from the top of the page
 
-    # Define the box where the image will be placed
-    img_width, img_height = im.size
-    img_x = (page_width - img_width) // 2
-    img_y = text_y + text_height - 200  # 200 points below the text
+    # Load the image
+    image_path = os.path.join("img", "hopper.ppm")  # Update this with your image path
+    with Image.open(image_path) as im:
+        # Resize the image if it's too large
+        im.thumbnail((page_width - 100, page_height // 2))
 
-    # Draw the image (75 dpi)
-    ps.image((img_x, img_y, img_x + img_width, img_y + img_height), im, 75)
+        # Define the box where the image will be placed
+        img_width, img_height = im.size
+        img_x = (page_width - img_width) // 2
+        img_y = text_y + text_height - 200  # 200 points below the text
 
-# Draw the text
-ps.setfont(font_name, font_size)
-ps.text((text_x, text_y), text)
+        # Draw the image (75 dpi)
+        ps.image((img_x, img_y, img_x + img_width, img_y + img_height), im, 75)
 
-# End the document
-ps.end_document()
-ps_file.close()
+    # Draw the text
+    ps.setfont(font_name, font_size)
+    ps.text((text_x, text_y), text)
+
+    # End the document
+    ps.end_document()
+    ps_file.close()
+
+
+def print_book(dest_path=os.path.join("img", "hopper_book.pdf"), executor=None):
+    """The same idea for many images: one captioned page per image in img/,
+    decoded and downsampled to print resolution on a worker pool and
+    written a page at a time (see printdoc.py). PS or PDF by extension."""
+    pages = (
+        (path, os.path.basename(path))
+        for path in sorted(glob.glob(os.path.join("img", "*.jpg")))
+    )
+    return write_document(dest_path, pages, dpi=150, title="img/", executor=executor)
+
+
+if __name__ == "__main__":
+    print_hopper()
+    print(print_book())
 
 
 # from PIL import Image, PSDraw
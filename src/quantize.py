@@ -0,0 +1,67 @@
+from PIL import Image
+
+
+def build_palette(images, colors=256, sample_size=256):
+    """One palette for a set of images, as a "P" image.
+
+    Each sample image is shrunk to fit sample_size and the pixels of all
+    of them are quantized once, as a single strip, so the palette reflects
+    every sample without running median cut per image. (Tiling them would
+    pad the gaps with a color none of the samples has.)
+    """
+    data = []
+    for im in images:
+        thumb = im.convert("RGB")
+        thumb.thumbnail((sample_size, sample_size))
+        data.append(thumb.tobytes())
+    data = b"".join(data)
+    return Image.frombytes("RGB", (len(data) // 3, 1), data).quantize(colors)
+
+
+class PaletteMapper:
+    """Maps RGB images onto one fixed palette.
+
+    Mapping goes through Pillow's palette conversion, which looks colors
+    up in a cached RGB -> index table rather than running median cut, so
+    each image costs a single pass. dither defaults to none, which keeps
+    flat sprite colors flat.
+    """
+
+    def __init__(self, palette, dither=Image.Dither.NONE):
+        if isinstance(palette, Image.Image):
+            palette = palette.getpalette("RGB")
+        self.palette = list(palette)
+        self.dither = dither
+        self._palette_image = Image.new("P", (1, 1))
+        self._palette_image.putpalette(self.palette)
+
+    @classmethod
+    def from_images(cls, images, colors=256, sample_size=256, **kwargs):
+        return cls(build_palette(images, colors, sample_size), **kwargs)
+
+    def quantize(self, im):
+        """im as a "P" image on this palette."""
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+        out = im.quantize(palette=self._palette_image, dither=self.dither)
+        # An RGB transparency color means nothing on the new indices (and
+        # can't be saved with them).
+        out.info.pop("transparency", None)
+        return out
+
+    def quantize_many(self, images):
+        for im in images:
+            yield self.quantize(im)
+
+
+def recolor(im, palette):
+    """Copy of a "P" image with a new palette; indices are left as they are."""
+    out = im.copy()
+    out.putpalette(palette)
+    return out
+
+
+def remap_indices(im, mapping):
+    """Rewrite a "P" image's indices (mapping[i] replaces i) in one point()
+    pass, keeping its palette."""
+    return im.point(list(mapping) + list(range(len(mapping), 256)))
@@ -1,14 +1,75 @@
-def roll(im, delta):
-    """Roll an image sideways."""
-    xsize, ysize = im.size
+from metrics import traced
 
-    delta = delta % xsize
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _box(vertical, start, stop, other):
+    return (0, start, other, stop) if vertical else (start, 0, stop, other)
+
+
+def _roll_axis(im, delta, vertical):
+    # Shift im's content towards the origin by delta along one axis, in
+    # place. Only the wrapped-around strip is held aside; the rest moves
+    # over in strip-sized chunks, so peak extra memory is about two strips
+    # rather than two near-full-size crops.
+    size, other = (im.size[1], im.size[0]) if vertical else im.size
+    delta %= size
     if delta == 0:
+        return
+
+    if delta <= size - delta:
+        # Move content backwards: [0, delta) wraps to the end.
+        strip = im.crop(_box(vertical, 0, delta, other))
+        chunk = max(delta, 64)
+        for start in range(delta, size, chunk):
+            stop = min(start + chunk, size)
+            part = im.crop(_box(vertical, start, stop, other))
+            im.paste(part, _box(vertical, start - delta, stop - delta, other))
+        im.paste(strip, _box(vertical, size - delta, size, other))
+    else:
+        # Cheaper to move forwards by size - delta: the tail wraps to 0.
+        shift = size - delta
+        strip = im.crop(_box(vertical, delta, size, other))
+        chunk = max(shift, 64)
+        for stop in range(delta, 0, -chunk):
+            start = max(stop - chunk, 0)
+            part = im.crop(_box(vertical, start, stop, other))
+            im.paste(part, _box(vertical, start + shift, stop + shift, other))
+        im.paste(strip, _box(vertical, 0, shift, other))
+
+
+def _roll_numpy(im, xdelta, ydelta):
+    # Pillow's __array_interface__ exports a copy of the pixels (the image
+    # isn't guaranteed to be one contiguous block), so this is one copy out,
+    # np.roll, and frombytes straight back into im's own storage.
+    arr = np.asarray(im)
+    rolled = np.roll(arr, (-ydelta, -xdelta), axis=(0, 1))
+    im.frombytes(np.ascontiguousarray(rolled))
+
+
+@traced("roll")
+def roll(im, xdelta, ydelta=0, backend="pillow"):
+    """Roll an image sideways (and/or up), in place.
+
+    Content moves left by xdelta and up by ydelta, wrapping around; negative
+    deltas roll the other way. backend is "pillow" or "numpy"; see
+    bench_roll.py for how they compare. Returns im for chaining.
+    """
+    im.load()
+    xdelta %= im.size[0]
+    ydelta %= im.size[1]
+    if xdelta == 0 and ydelta == 0:
         return im
 
-    part1 = im.crop((0, 0, delta, ysize))
-    part2 = im.crop((delta, 0, xsize, ysize))
-    im.paste(part1, (xsize - delta, 0, xsize, ysize))
-    im.paste(part2, (0, 0, xsize - delta, ysize))
+    if backend == "numpy" and im.mode != "1":
+        if np is None:
+            raise ImportError("the numpy backend requires numpy")
+        _roll_numpy(im, xdelta, ydelta)
+    else:
+        _roll_axis(im, xdelta, vertical=False)
+        _roll_axis(im, ydelta, vertical=True)
 
     return im
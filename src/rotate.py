@@ -1,4 +1,5 @@
 from PIL import Image
+from animation import save_animation
 import os
 
 # List of image filenames
@@ -9,14 +10,13 @@ image_filenames = [
     os.path.join("img", "rotated_hopper_90.jpg"),
 ]
 
-# Open images and append them to a list
-images = [Image.open(filename) for filename in image_filenames]
+# Open images lazily, one at a time, as the animation is written
+images = (Image.open(filename) for filename in image_filenames)
 
-# Save the images as an animated GIF
-images[0].save(
+# Save the images as an animated GIF with one shared palette
+save_animation(
     os.path.join("img", "animated_hopper.gif"),
-    save_all=True,
-    append_images=images[1:],
+    images,
     duration=500,  # duration of each frame in milliseconds
     loop=0,  # loop forever
 )
@@ -0,0 +1,346 @@
+from PIL import Image
+from buffer import open_image_from_bytes, save_image_to_buffer
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from merge import merge_images
+from urllib.parse import parse_qs, urlsplit
+import asyncio
+import hashlib
+import json
+import os
+import random
+
+# Everything a handler hands back; body is bytes.
+Response = namedtuple("Response", ["status", "headers", "body"])
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+# Operations. Each takes the opened source images and the query parameters
+# (strings) and returns (image, default output format). They run in the
+# worker processes.
+
+
+def _thumbnail(images, params):
+    size = int(params.get("size", 128))
+    im = images[0]
+    # thumbnail() drafts JPEGs and reduce()s before resampling.
+    im.thumbnail((size, size))
+    return im, "PNG"
+
+
+def _rotate(images, params):
+    angle = float(params.get("angle", 90))
+    expand = params.get("expand", "1") != "0"
+    return images[0].rotate(angle, Image.BICUBIC, expand), "PNG"
+
+
+def _merge(images, params):
+    layout = params.get("layout", "horizontal")
+    padding = int(params.get("padding", 0))
+    return merge_images(images, layout, padding=padding), "PNG"
+
+
+def _compress(images, params):
+    return images[0], "JPEG"
+
+
+def _palette(images, params):
+    # pal.py's random palette swap; seeded, so equal requests give equal
+    # images.
+    im = images[0]
+    if im.mode != "P":
+        im = im.convert("P", palette=Image.ADAPTIVE, colors=256)
+    rng = random.Random(params.get("seed", "0"))
+    im.putpalette(rng.randbytes(256 * 3))
+    return im, "PNG"
+
+
+OPS = {
+    "thumbnail": _thumbnail,
+    "rotate": _rotate,
+    "merge": _merge,
+    "compress": _compress,
+    "palette": _palette,
+}
+
+
+def render(op, sources, params):
+    """Run op on sources (paths or encoded bytes); returns (mime, bytes).
+
+    This is what the process pool executes.
+    """
+    with ExitStack() as stack:
+        images = [
+            stack.enter_context(
+                open_image_from_bytes(s)
+                if isinstance(s, (bytes, bytearray))
+                else Image.open(s)
+            )
+            for s in sources
+        ]
+        im, format = OPS[op](images, params)
+        format = params.get("format", format).upper()
+        save_params = {}
+        if format == "JPEG":
+            if im.mode not in ("RGB", "L"):
+                im = im.convert("RGB")
+            quality = int(params.get("quality", 80))
+            save_params = {"quality": quality, "optimize": True}
+        data = save_image_to_buffer(im, format, **save_params).getvalue()
+    return Image.MIME.get(format, "application/octet-stream"), data
+
+
+def _error(status, message):
+    body = json.dumps({"error": message}).encode()
+    return Response(status, {"Content-Type": "application/json"}, body)
+
+
+class ImageService:
+    """The demo operations over HTTP, on asyncio with a process pool.
+
+    GET /<op>?source=<path under root>&<params> or POST /<op>?<params>
+    with the image as the body. op is thumbnail (size), rotate (angle,
+    expand), merge (several source=, layout, padding), compress (quality)
+    or palette (seed); format picks the output encoding. GET /stats reports
+    counters.
+
+    Identical requests that arrive while one is already rendering share
+    its result instead of rendering again. At most max_pending distinct
+    renders are queued for the pool; beyond that requests get a 503 with
+    Retry-After rather than piling up. Responses are written chunk by
+    chunk, waiting on the socket between chunks, so slow clients don't
+    make the server buffer whole images.
+
+    cache, a derived.DerivedCache, makes repeat requests for the same
+    source content and parameters a lookup instead of a render.
+    """
+
+    def __init__(
+        self,
+        root="img",
+        workers=None,
+        max_pending=32,
+        max_body=64 << 20,
+        chunk_size=64 << 10,
+        executor=None,
+        cache=None,
+    ):
+        self.root = os.path.realpath(root)
+        self.cache = cache
+        self.max_pending = max_pending
+        self.max_body = max_body
+        self.chunk_size = chunk_size
+        self._own_executor = executor is None
+        self.executor = executor or ProcessPoolExecutor(max_workers=workers)
+        self._inflight = {}
+        self.stats = dict.fromkeys(
+            ["requests", "rendered", "coalesced", "rejected", "errors"], 0
+        )
+
+    def close(self):
+        if self._own_executor:
+            self.executor.shutdown(cancel_futures=True)
+
+    def _resolve(self, source):
+        path = os.path.realpath(os.path.join(self.root, source))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ValueError(f"source outside root: {source}")
+        st = os.stat(path)
+        # mtime in the key, so an edited file isn't coalesced with a render
+        # of its old content.
+        return path, (path, st.st_mtime_ns)
+
+    async def handle(self, method, target, body=b""):
+        """Answer one request; returns a Response."""
+        self.stats["requests"] += 1
+        url = urlsplit(target)
+        op = url.path.strip("/")
+        query = parse_qs(url.query)
+        if op == "stats":
+            body = json.dumps(
+                dict(self.stats, pending=len(self._inflight)), sort_keys=True
+            )
+            return Response(200, {"Content-Type": "application/json"}, body.encode())
+        if op not in OPS:
+            return _error(404, f"no operation {op!r}")
+        if method not in ("GET", "POST"):
+            return _error(405, f"{method} not allowed")
+
+        try:
+            if method == "POST":
+                sources = [body]
+                identity = [hashlib.sha256(body).hexdigest()]
+            else:
+                resolved = [self._resolve(s) for s in query.get("source", [])]
+                sources = [path for path, _ in resolved]
+                identity = [key for _, key in resolved]
+        except FileNotFoundError as e:
+            return _error(404, f"no such source: {os.path.basename(e.filename)}")
+        except (ValueError, OSError) as e:
+            return _error(400, str(e))
+        if not sources:
+            return _error(400, "missing source")
+
+        params = {k: v[-1] for k, v in query.items() if k != "source"}
+        key = (op, tuple(identity), tuple(sorted(params.items())))
+        cache_key = None
+        if self.cache is not None:
+            loop = asyncio.get_running_loop()
+            cache_key = await loop.run_in_executor(
+                None, self.cache.key, sources, [(op, params)]
+            )
+            cached = await loop.run_in_executor(None, self.cache.get, cache_key)
+            if cached is not None:
+                format = params.get("format", "JPEG" if op == "compress" else "PNG")
+                content_type = Image.MIME.get(
+                    format.upper(), "application/octet-stream"
+                )
+                return Response(200, {"Content-Type": content_type}, cached)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            if len(self._inflight) >= self.max_pending:
+                self.stats["rejected"] += 1
+                response = _error(503, "busy")
+                response.headers["Retry-After"] = "1"
+                return response
+            task = asyncio.ensure_future(self._render(op, sources, params, cache_key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.stats["rendered"] += 1
+
+        try:
+            # shield: a client hanging up mustn't cancel a render others
+            # are waiting on.
+            content_type, data = await asyncio.shield(task)
+        except (ValueError, OSError) as e:
+            self.stats["errors"] += 1
+            return _error(400, f"{type(e).__name__}: {e}")
+        except Exception as e:
+            self.stats["errors"] += 1
+            return _error(500, f"{type(e).__name__}: {e}")
+        return Response(200, {"Content-Type": content_type}, data)
+
+    async def _render(self, op, sources, params, cache_key):
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.executor, render, op, sources, params)
+        if cache_key is not None:
+            await loop.run_in_executor(None, self.cache.put, cache_key, result[1])
+        return result
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body:
+                    await self._respond(writer, _error(413, "body too large"), False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = (
+                    headers.get("connection", "").lower() != "close"
+                    and version == "HTTP/1.1"
+                )
+                response = await self.handle(method, target, body)
+                await self._respond(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, response, keep_alive):
+        status, headers, body = response
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        headers = dict(headers, **{"Content-Length": str(len(body))})
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        view = memoryview(body)
+        for start in range(0, len(view), self.chunk_size):
+            writer.write(view[start : start + self.chunk_size])
+            await writer.drain()
+        await writer.drain()
+
+    async def start(self, host="127.0.0.1", port=8000):
+        """Listen on host:port; returns the asyncio Server."""
+        return await asyncio.start_server(self._serve, host, port)
+
+
+class LocalClient:
+    """Calls an ImageService in-process, skipping the network.
+
+    Same requests and Responses as over HTTP, for tests and load scripts.
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    async def get(self, target):
+        return await self.service.handle("GET", target)
+
+    async def post(self, target, body):
+        return await self.service.handle("POST", target, body)
+
+
+async def http_request(host, port, method, target, body=b""):
+    """Minimal HTTP/1.1 client for talking to a running ImageService."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        head = (
+            f"{method} {target} HTTP/1.1\r\nHost: {host}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip()] = value.strip()
+        data = await reader.readexactly(int(headers.get("Content-Length", 0)))
+        return Response(status, headers, data)
+    finally:
+        writer.close()
+
+
+async def main(host="127.0.0.1", port=8000):
+    service = ImageService()
+    server = await service.start(host, port)
+    print(f"Serving on http://{host}:{port}/ (try /thumbnail?source=hopper.ppm)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+from PIL import Image
+from collections import namedtuple
+import os
+import time
+
+DEFAULT_SIZES = (1024, 256, 64)
+
+# decoded_size is the size after draft/reduce, before any resampling.
+ThumbnailReport = namedtuple(
+    "ThumbnailReport",
+    ["source", "original_size", "decoded_size", "decode_seconds", "resample_seconds"],
+)
+
+
+def _box(size):
+    return (size, size) if isinstance(size, int) else tuple(size)
+
+
+def fit_size(image_size, box):
+    # Largest size with the image's aspect ratio that fits in box, never
+    # larger than the image itself.
+    w, h = image_size
+    scale = min(box[0] / w, box[1] / h, 1.0)
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def make_thumbnails(source, sizes=DEFAULT_SIZES, resample=Image.LANCZOS):
+    """Build several thumbnails from a single decode.
+
+    JPEG sources are decoded with draft(), letting libjpeg do DCT scaling
+    down to the smallest scale that still covers the largest requested
+    size. Other formats are decoded in full and shrunk with reduce() first.
+    Thumbnails are then produced largest-first, each one resampled from the
+    previous, so small sizes never touch the full-resolution pixels.
+
+    Returns ({size: image}, ThumbnailReport).
+    """
+    start = time.perf_counter()
+    with Image.open(source) as im:
+        original_size = im.size
+        # Largest output first; a box's own size says little, since
+        # (100, 30) can give a smaller thumbnail than 64.
+        targets = sorted(
+            ((fit_size(original_size, _box(s)), s) for s in sizes),
+            key=lambda t: t[0][0] * t[0][1],
+            reverse=True,
+        )
+        largest = targets[0][0]
+        if im.format == "JPEG":
+            im.draft(im.mode, largest)
+        im.load()
+        decoded_size = im.size
+        if im.mode in ("RGB", "RGBA", "L", "LA"):
+            base = im
+        else:
+            base = im.convert("RGBA" if im.mode in ("P", "PA") else "RGB")
+        decoded = time.perf_counter()
+
+        factor = min(base.width // largest[0], base.height // largest[1])
+        if factor >= 2:
+            base = base.reduce(factor)
+
+        top = base
+        thumbs = {}
+        for target, size in targets:
+            if base.width < target[0] or base.height < target[1]:
+                # Never upscale a smaller thumbnail.
+                base = top
+            if base.size != target:
+                base = base.resize(target, resample)
+            thumbs[size] = base if base is not im else base.copy()
+    done = time.perf_counter()
+
+    report = ThumbnailReport(
+        str(source), original_size, decoded_size, decoded - start, done - decoded
+    )
+    return thumbs, report
+
+
+def save_thumbnails(source, dest_dir, sizes=DEFAULT_SIZES, quality=85):
+    """Write <stem>_<size>.jpg for each size. Returns (paths, report)."""
+    thumbs, report = make_thumbnails(source, sizes)
+    stem = os.path.splitext(os.path.basename(source))[0]
+    paths = []
+    for size, thumb in thumbs.items():
+        suffix = size if isinstance(size, int) else "x".join(map(str, size))
+        path = os.path.join(dest_dir, f"{stem}_{suffix}.jpg")
+        if thumb.mode != "RGB":
+            thumb = thumb.convert("RGB")
+        thumb.save(path, "JPEG", quality=quality)
+        paths.append(path)
+    return paths, report
@@ -0,0 +1,173 @@
+from PIL import Image
+import mmap
+import struct
+import tempfile
+
+# TIFF PhotometricInterpretation for each mode we can stream.
+_PHOTOMETRIC = {"L": 1, "RGB": 2, "RGBA": 2, "CMYK": 5}
+
+
+class TiledCanvas:
+    """A canvas too big for RAM, kept in a memory-mapped scratch file.
+
+    Pixels are stored tile by tile (tile_size, both multiples of 16), each
+    tile a contiguous run of raw bytes. paste() only touches the tiles it
+    overlaps, and save_tiff() streams the tiles straight out as a tiled
+    TIFF, so neither step ever needs the whole raster in memory.
+    """
+
+    def __init__(self, size, mode="RGB", tile_size=(512, 512), background=0, dir=None):
+        if mode not in _PHOTOMETRIC:
+            raise ValueError(f"unsupported mode {mode!r}")
+        if tile_size[0] % 16 or tile_size[1] % 16:
+            raise ValueError("tile dimensions must be multiples of 16")
+        self.size = size
+        self.mode = mode
+        self.tile_size = tile_size
+        self.bands = len(mode)
+        self.tiles_across = -(-size[0] // tile_size[0])
+        self.tiles_down = -(-size[1] // tile_size[1])
+        self.tile_bytes = tile_size[0] * tile_size[1] * self.bands
+
+        length = self.tiles_across * self.tiles_down * self.tile_bytes
+        self._file = tempfile.TemporaryFile(dir=dir)
+        # A sparse file: disk is only used for tiles that get written.
+        self._file.truncate(length)
+        self._map = mmap.mmap(self._file.fileno(), length)
+        if background:
+            fill = Image.new(mode, tile_size, background).tobytes()
+            for i in range(self.tiles_across * self.tiles_down):
+                self._map[i * self.tile_bytes : (i + 1) * self.tile_bytes] = fill
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _offset(self, col, row):
+        return (row * self.tiles_across + col) * self.tile_bytes
+
+    def _read_tile(self, col, row):
+        offset = self._offset(col, row)
+        data = self._map[offset : offset + self.tile_bytes]
+        return Image.frombytes(self.mode, self.tile_size, data)
+
+    def _write_tile(self, col, row, tile):
+        offset = self._offset(col, row)
+        self._map[offset : offset + self.tile_bytes] = tile.tobytes()
+
+    def _tiles_in(self, box):
+        tw, th = self.tile_size
+        x0, y0, x1, y1 = box
+        for row in range(max(y0, 0) // th, min(-(-y1 // th), self.tiles_down)):
+            for col in range(max(x0, 0) // tw, min(-(-x1 // tw), self.tiles_across)):
+                yield col, row, (col * tw, row * th)
+
+    def paste(self, im, xy=(0, 0), mask=None):
+        """Paste im with its top-left corner at xy, tile by tile."""
+        if im.mode != self.mode:
+            im = im.convert(self.mode)
+        x, y = xy
+        box = (x, y, x + im.width, y + im.height)
+        tw, th = self.tile_size
+        for col, row, (tx, ty) in self._tiles_in(box):
+            # The part of im that lands on this tile, in im's coordinates.
+            part = (
+                max(tx - x, 0),
+                max(ty - y, 0),
+                min(tx + tw - x, im.width),
+                min(ty + th - y, im.height),
+            )
+            dest = (x + part[0] - tx, y + part[1] - ty)
+            covers = (
+                mask is None and part[2] - part[0] == tw and part[3] - part[1] == th
+            )
+            # A fully covered tile doesn't need reading back first.
+            tile = (
+                Image.new(self.mode, self.tile_size)
+                if covers
+                else self._read_tile(col, row)
+            )
+            tile.paste(
+                im.crop(part), dest, mask.crop(part) if mask is not None else None
+            )
+            self._write_tile(col, row, tile)
+
+    def crop(self, box):
+        """Read a region back as an ordinary in-memory image."""
+        out = Image.new(self.mode, (box[2] - box[0], box[3] - box[1]))
+        for col, row, (tx, ty) in self._tiles_in(box):
+            out.paste(self._read_tile(col, row), (tx - box[0], ty - box[1]))
+        return out
+
+    def save_tiff(self, fp, bigtiff=None):
+        """Stream the canvas to fp (a path or binary file) as a tiled TIFF.
+
+        Tiles are written uncompressed straight from the scratch map, in
+        order, so offsets are known up front and fp needn't be seekable.
+        BigTIFF is used when the data won't fit 32-bit offsets, unless
+        bigtiff says otherwise.
+        """
+        if isinstance(fp, (str, bytes)) or hasattr(fp, "__fspath__"):
+            with open(fp, "wb") as f:
+                return self.save_tiff(f, bigtiff)
+
+        count = self.tiles_across * self.tiles_down
+        big = bigtiff
+        if big is None:
+            big = count * self.tile_bytes + 4096 > 0xFFFFFFFF
+        header = 16 if big else 8
+        ifd_offset = header + count * self.tile_bytes
+
+        if big:
+            fp.write(struct.pack("<2sHHHQ", b"II", 43, 8, 0, ifd_offset))
+        else:
+            fp.write(struct.pack("<2sHI", b"II", 42, ifd_offset))
+        for i in range(count):
+            fp.write(self._map[i * self.tile_bytes : (i + 1) * self.tile_bytes])
+        fp.write(self._ifd(ifd_offset, header, count, big))
+
+    def _ifd(self, ifd_offset, data_offset, count, big):
+        SHORT, LONG, LONG8 = 3, 4, 16
+        offset_type = LONG8 if big else LONG
+        tags = [
+            (256, LONG, [self.size[0]]),
+            (257, LONG, [self.size[1]]),
+            (258, SHORT, [8] * self.bands),
+            (259, SHORT, [1]),
+            (262, SHORT, [_PHOTOMETRIC[self.mode]]),
+            (277, SHORT, [self.bands]),
+            (284, SHORT, [1]),
+            (322, LONG, [self.tile_size[0]]),
+            (323, LONG, [self.tile_size[1]]),
+            (
+                324,
+                offset_type,
+                [data_offset + i * self.tile_bytes for i in range(count)],
+            ),
+            (325, offset_type, [self.tile_bytes] * count),
+        ]
+        if self.mode == "RGBA":
+            tags.append((338, SHORT, [2]))  # unassociated alpha
+
+        entry, count_fmt, inline = (20, "Q", 8) if big else (12, "I", 4)
+        item_fmt = {SHORT: "H", LONG: "I", LONG8: "Q"}
+        # Values that don't fit inline go after the entry table.
+        extra_offset = ifd_offset + (8 if big else 2) + len(tags) * entry + inline
+        entries = b""
+        extra = b""
+        for tag, typ, values in tags:
+            data = struct.pack(f"<{len(values)}{item_fmt[typ]}", *values)
+            if len(data) <= inline:
+                value = data.ljust(inline, b"\0")
+            else:
+                value = struct.pack(f"<{count_fmt}", extra_offset + len(extra))
+                extra += data
+            entries += struct.pack(f"<HH{count_fmt}", tag, typ, len(values)) + value
+        head = struct.pack("<Q" if big else "<H", len(tags))
+        return head + entries + b"\0" * inline + extra
@@ -0,0 +1,136 @@
+from PIL import Image, ImageEnhance, ImageFilter, ImageStat
+from bounded import bounded_submit
+from contextlib import closing
+
+DEFAULT_TILE_SIZE = 1024
+
+
+def _pair(value):
+    return tuple(value) if isinstance(value, (tuple, list)) else (value, value)
+
+
+def filter_halo(f):
+    """How far (x, y) one output pixel of f reaches into its input.
+
+    None if f is a filter whose reach isn't known, which must then run on
+    the whole image.
+    """
+    if isinstance(f, type):
+        f = f()
+    if isinstance(f, (ImageFilter.GaussianBlur, ImageFilter.UnsharpMask)):
+        # Three extended box blurs, each reaching a little over sigma.
+        return tuple(3 * (int(r) + 2) for r in _pair(f.radius))
+    if isinstance(f, ImageFilter.BoxBlur):
+        return tuple(int(r) + 1 for r in _pair(f.radius))
+    if isinstance(f, (ImageFilter.Kernel, ImageFilter.BuiltinFilter)):
+        return tuple(n // 2 for n in f.filterargs[0])
+    if isinstance(f, (ImageFilter.RankFilter, ImageFilter.ModeFilter)):
+        return (f.size // 2, f.size // 2)
+    if isinstance(f, ImageFilter.Color3DLUT):
+        return (0, 0)
+    return None
+
+
+def tile_boxes(size, tile_size=DEFAULT_TILE_SIZE, halo=(0, 0)):
+    """Yield (box, padded_box) covering an image of size.
+
+    box tiles the image without overlap; padded_box grows it by halo on
+    each side, clamped to the image, so a filter run on padded_box is
+    correct everywhere inside box.
+    """
+    w, h = size
+    tw, th = _pair(tile_size)
+    hx, hy = halo
+    for y in range(0, h, th):
+        for x in range(0, w, tw):
+            box = (x, y, min(x + tw, w), min(y + th, h))
+            padded = (
+                max(box[0] - hx, 0),
+                max(box[1] - hy, 0),
+                min(box[2] + hx, w),
+                min(box[3] + hy, h),
+            )
+            yield box, padded
+
+
+def _run_tile(fn, im, box, padded):
+    out = fn(im.crop(padded))
+    dx, dy = box[0] - padded[0], box[1] - padded[1]
+    return out.crop((dx, dy, dx + box[2] - box[0], dy + box[3] - box[1]))
+
+
+def run_tiled(
+    im,
+    fn,
+    halo,
+    tile_size=DEFAULT_TILE_SIZE,
+    workers=None,
+    max_pending=None,
+    executor=None,
+):
+    """Apply fn (image -> same-size image) tile by tile on a thread pool.
+
+    Pillow's filters release the GIL while they run, so tiles are worked
+    on in parallel, queued through bounded_submit at most max_pending at a
+    time; each result is stitched into the output as it comes back.
+    """
+    im.load()
+    tiles = list(tile_boxes(im.size, tile_size, halo))
+    if len(tiles) == 1:
+        return fn(im)
+
+    out = None
+    calls = ((fn, im, box, padded) for box, padded in tiles)
+    done = bounded_submit(_run_tile, calls, workers, max_pending, executor)
+    with closing(done):
+        for (_, _, box, _), future in done:
+            tile = future.result()
+            if out is None:
+                out = Image.new(tile.mode, im.size)
+            out.paste(tile, box[:2])
+    return out
+
+
+def filter_tiled(im, f, tile_size=DEFAULT_TILE_SIZE, workers=None, executor=None):
+    """im.filter(f), computed over overlapping tiles on a thread pool.
+
+    The overlap is the filter's reach (see filter_halo), so the stitched
+    result is identical to filtering the whole image. Filters of unknown
+    reach fall back to a single im.filter() call.
+    """
+    if isinstance(f, type):
+        f = f()
+    halo = filter_halo(f)
+    if halo is None:
+        return im.filter(f)
+    return run_tiled(
+        im, lambda tile: tile.filter(f), halo, tile_size, workers, executor=executor
+    )
+
+
+def enhance_tiled(
+    im, enhancer, factor, tile_size=DEFAULT_TILE_SIZE, workers=None, executor=None
+):
+    """enhancer(im).enhance(factor) (an ImageEnhance class), over tiles.
+
+    Contrast blends towards the mean grey of the whole image, so that is
+    measured once up front and shared by every tile.
+    """
+    halo = (0, 0)
+    if enhancer is ImageEnhance.Sharpness:
+        halo = filter_halo(ImageFilter.SMOOTH)
+    if enhancer is ImageEnhance.Contrast:
+        mean = int(ImageStat.Stat(im.convert("L")).mean[0] + 0.5)
+
+        def fn(tile):
+            degenerate = Image.new("L", tile.size, mean).convert(tile.mode)
+            if "A" in tile.getbands():
+                degenerate.putalpha(tile.getchannel("A"))
+            return Image.blend(degenerate, tile, factor)
+
+    else:
+
+        def fn(tile):
+            return enhancer(tile).enhance(factor)
+
+    return run_tiled(im, fn, halo, tile_size, workers, executor=executor)
@@ -0,0 +1,30 @@
+from PIL import Image
+from animation import save_animation
+import pytest
+
+
+@pytest.fixture
+def frames():
+    hopper = Image.open("img/hopper.jpg")
+    return [hopper.rotate(angle) for angle in (0, 10, 20)]
+
+
+def test_gif_follows_dither_and_comment(tmp_path, frames):
+    plain, dithered = tmp_path / "plain.gif", tmp_path / "dithered.gif"
+    save_animation(plain, frames, dither=Image.Dither.NONE, comment="hopper")
+    save_animation(dithered, frames)
+    assert plain.read_bytes() != dithered.read_bytes()
+    with Image.open(plain) as im:
+        assert (im.n_frames, im.info["comment"]) == (3, b"hopper")
+
+
+def test_gif_refuses_options_it_would_drop(tmp_path, frames):
+    with pytest.raises(TypeError, match="optimize"):
+        save_animation(tmp_path / "out.gif", frames, optimize=True)
+
+
+def test_apng_follows_dither(tmp_path, frames):
+    plain, dithered = tmp_path / "plain.png", tmp_path / "dithered.png"
+    save_animation(plain, frames, dither=Image.Dither.NONE)
+    save_animation(dithered, frames)
+    assert plain.read_bytes() != dithered.read_bytes()
@@ -0,0 +1,70 @@
+from PIL import Image
+from unittest import mock
+import batch
+import dedupe
+import os
+import pytest
+
+
+@pytest.fixture
+def sources(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    hopper = Image.open("img/hopper.jpg")
+    hopper.save(src / "a.png")
+    hopper.transpose(Image.Transpose.FLIP_TOP_BOTTOM).save(src / "b.png")
+    return src
+
+
+def run(src, dest, **kwargs):
+    results, summary = batch.compress_incremental(
+        str(src / "*.png"), str(dest), workers=1, **kwargs
+    )
+    return summary
+
+
+def test_incremental_skips_and_prunes(tmp_path, sources):
+    dest = tmp_path / "out"
+    assert run(sources, dest)["succeeded"] == 2
+    summary = run(sources, dest)
+    assert (summary["succeeded"], summary["skipped"]) == (0, 2)
+
+    os.remove(sources / "b.png")
+    summary = run(sources, dest)
+    assert summary["pruned"] == 1
+    assert sorted(os.listdir(dest)) == [".manifest.json", "a.jpg"]
+
+
+def test_duplicates_of_encoded_sources_are_skipped(tmp_path, sources):
+    dest = tmp_path / "out"
+    run(sources, dest, dedupe=4)
+    Image.open(sources / "a.png").save(sources / "c.png")
+
+    summary = run(sources, dest, dedupe=4)
+    assert summary["duplicate_of"] == {str(sources / "c.png"): str(sources / "a.png")}
+    assert not (dest / "c.jpg").exists()
+
+    # Nothing changed, so nothing is hashed again.
+    with mock.patch.object(dedupe, "hash_files", wraps=dedupe.hash_files) as spy:
+        summary = run(sources, dest, dedupe=4)
+    assert all(not list(call.args[0]) for call in spy.call_args_list)
+    assert (summary["skipped"], summary["duplicates"]) == (2, 1)
+
+
+def test_duplicate_output_is_removed(tmp_path, sources):
+    dest = tmp_path / "out"
+    run(sources, dest, dedupe=4)
+    assert (dest / "b.jpg").exists()
+    # b becomes a copy of a, and both change in the same run.
+    hopper = Image.open("img/hopper.jpg").rotate(1)
+    hopper.save(sources / "a.png")
+    hopper.save(sources / "b.png")
+    summary = run(sources, dest, dedupe=4)
+    assert (summary["succeeded"], summary["duplicates"], summary["pruned"]) == (1, 1, 1)
+    assert not (dest / "b.jpg").exists()
+
+    # Once it stops being a duplicate it is encoded again.
+    Image.radial_gradient("L").convert("RGB").save(sources / "b.png")
+    summary = run(sources, dest, dedupe=4)
+    assert (summary["succeeded"], summary["duplicates"]) == (1, 0)
+    assert (dest / "b.jpg").exists()
@@ -0,0 +1,52 @@
+from bounded import bounded_submit
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+
+def test_keeps_order_and_bound():
+    submitted = []
+
+    def calls():
+        for i in range(20):
+            submitted.append(i)
+            yield (i,)
+
+    seen = []
+    for (i,), future in bounded_submit(lambda i: i * i, calls(), max_pending=3):
+        # max_pending still running, plus the finished one in hand.
+        assert len(submitted) - len(seen) <= 3 + 1
+        seen.append(future.result())
+    assert seen == [i * i for i in range(20)]
+
+
+def test_unordered_yields_as_completed():
+    def slow(i):
+        time.sleep(0.05 if i == 0 else 0)
+        return i
+
+    calls = [(i,) for i in range(8)]
+    results = [
+        f.result() for _, f in bounded_submit(slow, calls, workers=4, ordered=False)
+    ]
+    assert sorted(results) == list(range(8))
+    assert results[0] != 0
+
+
+def test_closing_cancels_queued_calls_and_keeps_given_executor():
+    gate = threading.Event()
+    ran = []
+
+    def fn(i):
+        if i:
+            gate.wait()
+        ran.append(i)
+
+    with ThreadPoolExecutor(1) as executor:
+        gen = bounded_submit(fn, [(i,) for i in range(10)], 1, 4, executor)
+        next(gen)
+        gen.close()
+        gate.set()
+        executor.submit(lambda: None).result()
+    # Only 1 may have started before close(); the rest were cancelled.
+    assert ran in ([0], [0, 1])
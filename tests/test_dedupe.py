@@ -0,0 +1,51 @@
+from PIL import Image
+from dedupe import BKTree, drop_duplicate_jobs, hamming, image_hash
+import pytest
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "photo.jpg"
+    Image.open("img/hopper.jpg").resize((512, 512)).save(path)
+    return str(path)
+
+
+def test_bktree_search_matches_scan():
+    values = [(i * 0x9E3779B97F4A7C15) & (2**64 - 1) for i in range(300)]
+    tree = BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, i)
+    query = values[7] ^ 0b1011
+    expected = sorted(
+        (hamming(query, v), i) for i, v in enumerate(values) if hamming(query, v) <= 20
+    )
+    assert sorted(tree.search(query, 20)) == expected
+
+
+@pytest.mark.parametrize("kind", ["ahash", "dhash", "phash"])
+def test_hash_leaves_a_callers_image_alone(photo, kind):
+    with Image.open(photo) as im:
+        value = image_hash(im, kind)
+        assert (im.mode, im.size) == ("RGB", (512, 512))
+    assert hamming(value, image_hash(photo, kind)) <= 4
+
+
+def test_drop_duplicate_jobs(tmp_path, photo):
+    copy = str(tmp_path / "copy.png")
+    other = str(tmp_path / "other.png")
+    Image.open(photo).save(copy)
+    Image.radial_gradient("L").save(other)
+    jobs = [(photo, "a"), (copy, "b"), (other, "c")]
+
+    hashes = {}
+    kept, duplicate_of = drop_duplicate_jobs(jobs, 4, hashes=hashes)
+    assert kept == [(photo, "a"), (other, "c")]
+    assert duplicate_of == {copy: photo}
+    assert set(hashes) == {photo, copy, other}
+
+    # An original from elsewhere wins over every job that matches it.
+    kept, duplicate_of = drop_duplicate_jobs(
+        jobs[1:], 4, known=[(hashes[photo], photo)], hashes=hashes
+    )
+    assert kept == [(other, "c")]
+    assert duplicate_of == {copy: photo}
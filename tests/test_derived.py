@@ -0,0 +1,40 @@
+from PIL import Image
+from derived import DerivedCache, normalize_ops
+from pipeline import Pipeline
+import pytest
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DerivedCache(str(tmp_path / "cache"))
+
+
+def test_pipeline_renders_once(cache):
+    pipeline = Pipeline(Image.linear_gradient("L")).resize((64, 64))
+    first = cache.pipeline(pipeline, "PNG")
+    assert cache.pipeline(pipeline, "PNG") == first
+    info = cache.info()
+    assert (info["misses"], info["memory_hits"]) == (1, 1)
+
+
+def test_key_covers_exact_and_params(cache):
+    im = Image.linear_gradient("L")
+    exact = Pipeline(im).resize((64, 64))
+    loose = Pipeline(im, exact=False).resize((64, 64))
+    assert cache.key(im, exact) != cache.key(im, loose)
+    assert cache.key(im, exact, "JPEG", quality=80) != cache.key(
+        im, exact, "JPEG", quality=90
+    )
+
+
+def test_palette_images_with_the_same_indices_differ(cache):
+    red, blue = Image.new("P", (4, 4)), Image.new("P", (4, 4))
+    red.putpalette([255, 0, 0])
+    blue.putpalette([0, 0, 255])
+    ops = [("convert", "RGB")]
+    assert cache.key(red, ops) != cache.key(blue, ops)
+
+
+def test_functions_are_refused():
+    with pytest.raises(TypeError):
+        normalize_ops([("point", lambda i: i * 2)])
@@ -0,0 +1,64 @@
+from PIL import Image
+from metaindex import MetadataIndex
+import os
+import pytest
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for name, size in [
+        ("img/a.png", (40, 30)),
+        ("img/sub/b.png", (1200, 10)),
+        ("IMG/c.png", (8, 8)),
+        ("img_2/d.png", (8, 8)),
+    ]:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", size).save(path)
+    return tmp_path
+
+
+@pytest.fixture
+def index(tmp_path):
+    with MetadataIndex(str(tmp_path / "index.sqlite")) as index:
+        yield index
+
+
+def names(records, root):
+    return sorted(os.path.relpath(r.path, root) for r in records)
+
+
+def test_refresh_only_rereads_changes(tree, index):
+    summary = index.refresh([str(tree / "img"), str(tree / "IMG")])
+    assert (summary["added"], summary["removed"]) == (3, 0)
+    summary = index.refresh(str(tree / "img"))
+    assert (summary["unchanged"], summary["removed"]) == (2, 0)
+
+    Image.new("L", (5, 5)).save(tree / "img" / "a.png")
+    os.remove(tree / "img" / "sub" / "b.png")
+    summary = index.refresh(str(tree / "img"))
+    assert (summary["updated"], summary["removed"]) == (1, 1)
+    assert index.get(str(tree / "img" / "a.png")).mode == "L"
+
+
+def test_prune_and_query_respect_case_and_wildcards(tree, index):
+    index.refresh([str(tree / "IMG"), str(tree / "img_2")])
+    # Neither "img" nor its LIKE wildcard "_" may reach IMG/ or img_2/.
+    assert index.refresh(str(tree / "img"))["removed"] == 0
+    assert names(index.query(under=str(tree / "img")), tree) == [
+        os.path.join("img", "a.png"),
+        os.path.join("img", "sub", "b.png"),
+    ]
+    assert names(index.query(under=str(tree / "IMG")), tree) == [
+        os.path.join("IMG", "c.png")
+    ]
+    assert names(index.query(min_width=1000), tree) == [
+        os.path.join("img", "sub", "b.png")
+    ]
+
+
+def test_sizes_picks_up_replaced_files(tree, index):
+    path = str(tree / "img" / "a.png")
+    assert index.sizes([path]) == [(40, 30)]
+    Image.new("RGB", (7, 9)).save(path)
+    assert index.sizes([path]) == [(7, 9)]
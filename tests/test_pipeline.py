@@ -0,0 +1,142 @@
+from PIL import Image, ImageChops, ImageEnhance
+from pipeline import Pipeline
+import pytest
+import random
+
+T = Image.Transpose
+
+
+def max_diff(a, b):
+    assert (a.size, a.mode) == (b.size, b.mode)
+    extrema = ImageChops.difference(a, b).getextrema()
+    if isinstance(extrema[0], int):
+        return extrema[1]
+    return max(high for _, high in extrema)
+
+
+def gradient(size):
+    # Something with detail in every band, so misplaced samples show up.
+    r = Image.linear_gradient("L").resize(size)
+    g = r.transpose(T.ROTATE_90).resize(size)
+    b = Image.radial_gradient("L").resize(size)
+    return Image.merge("RGB", (r, g, b)).effect_spread(3)
+
+
+def naive(im, ops):
+    for op, *args in ops:
+        if op == "enhance":
+            im = args[0](im).enhance(args[1])
+        else:
+            im = getattr(im, op)(*args)
+    return im
+
+
+def build(source, ops):
+    pipeline = Pipeline(source)
+    for op, *args in ops:
+        pipeline = getattr(pipeline, op)(*args)
+    return pipeline
+
+
+@pytest.mark.parametrize("angle", [90, 270, -90, 450])
+def test_rotate_expand_by_90_swaps_size_exactly(angle):
+    im = Image.new("RGB", (87, 30))
+    pipeline = Pipeline(im).rotate(angle, expand=True)
+    assert pipeline.size == im.rotate(angle, expand=True).size == (30, 87)
+    assert pipeline.resize((10, 10)).run().size == (10, 10)
+
+
+@pytest.mark.parametrize("angle", [30, 45, 100, 333])
+def test_rotate_expand_size_matches_pillow(angle):
+    for size in [(87, 30), (64, 64), (101, 7)]:
+        im = Image.new("L", size)
+        assert Pipeline(im).rotate(angle, expand=True).size == (
+            im.rotate(angle, expand=True).size
+        )
+
+
+@pytest.mark.parametrize("method", ["contain", "cover", "fit", "pad"])
+def test_imageops_equivalents_after_rotate(method):
+    from PIL import ImageOps
+
+    im = gradient((87, 30))
+    expected = getattr(ImageOps, method)(im.rotate(90, expand=True), (20, 20))
+    result = getattr(Pipeline(im).rotate(90, expand=True), method)((20, 20)).run()
+    assert result.size == expected.size
+
+
+@pytest.mark.parametrize(
+    "ops",
+    [
+        [("resize", (267, 300), Image.BOX), ("crop", (13, 17, 200, 211))],
+        [("resize", (60, 151), Image.NEAREST), ("crop", (23, 65, 43, 92))],
+        [("resize", (256, 256), Image.BICUBIC), ("crop", (10, 20, 110, 120))],
+        [("resize", (33, 97), Image.LANCZOS), ("crop", (3, 5, 30, 90))],
+        [("transpose", T.ROTATE_90), ("crop", (4, 9, 60, 70))],
+        [("rotate", 90, Image.NEAREST, True), ("resize", (10, 10))],
+    ],
+)
+def test_rewrites_match_naive_chain(ops):
+    im = gradient((128, 96))
+    assert max_diff(build(im, ops).run(), naive(im, ops)) == 0
+
+
+def test_folds_crop_only_when_exact():
+    im = gradient((128, 128))
+    folded = Pipeline(im).resize((256, 256)).crop((10, 20, 110, 120))
+    assert [step[0] for step in folded.steps()] == ["resize"]
+    kept = Pipeline(im).resize((267, 300), Image.BOX).crop((13, 17, 200, 211))
+    assert [step[0] for step in kept.steps()] == ["resize", "crop"]
+
+
+@pytest.mark.parametrize("mode", ["1", "P"])
+def test_crop_stays_behind_dithering_convert(mode):
+    im = gradient((100, 100))
+    pipeline = Pipeline(im).convert(mode).crop((10, 10, 90, 90))
+    assert [step[0] for step in pipeline.steps()] == ["convert", "crop"]
+    expected = im.convert(mode).crop((10, 10, 90, 90))
+    assert pipeline.run().tobytes() == expected.tobytes()
+
+
+def random_ops(rng, size, mode="RGB"):
+    filters = [Image.NEAREST, Image.BOX, Image.BILINEAR, Image.BICUBIC]
+    ops = []
+    w, h = size
+    for _ in range(rng.randint(1, 5)):
+        kind = rng.choice(
+            ["crop", "resize", "transpose", "rotate", "enhance", "convert"]
+        )
+        if kind == "crop" and w > 2 and h > 2:
+            x0, y0 = rng.randrange(w - 1), rng.randrange(h - 1)
+            box = (x0, y0, rng.randint(x0 + 1, w), rng.randint(y0 + 1, h))
+            ops.append(("crop", box))
+            w, h = box[2] - box[0], box[3] - box[1]
+        elif kind == "resize":
+            w, h = rng.randint(1, 200), rng.randint(1, 200)
+            ops.append(("resize", (w, h), rng.choice(filters)))
+        elif kind == "transpose":
+            method = rng.choice(list(T))
+            ops.append(("transpose", method))
+            w, h = Image.new("L", (w, h)).transpose(method).size
+        elif kind == "rotate":
+            angle = rng.choice([0, 90, 180, 270, -90, 30])
+            expand = rng.random() < 0.7
+            ops.append(("rotate", angle, Image.NEAREST, expand))
+            w, h = Image.new("L", (w, h)).rotate(angle, expand=expand).size
+        elif kind == "convert":
+            # RGB to L is left out: moving it is only exact up to rounding.
+            choices = ["1", "P", "RGB"] + (["L"] if mode != "RGB" else [])
+            mode = rng.choice(choices)
+            ops.append(("convert", mode))
+        elif kind == "enhance" and mode in ("RGB", "L"):
+            enhancer = rng.choice([ImageEnhance.Brightness, ImageEnhance.Color])
+            ops.append(("enhance", enhancer, rng.random() * 2))
+    return ops
+
+
+def test_random_chains_match_naive_chain():
+    rng = random.Random(0)
+    for _ in range(200):
+        im = gradient((rng.randint(20, 160), rng.randint(20, 160)))
+        ops = random_ops(rng, im.size)
+        assert max_diff(build(im, ops).run(), naive(im, ops)) == 0, ops
@@ -0,0 +1,57 @@
+from PIL import Image, ImageChops
+from pointops import PointProgram, B, G, R, X, where
+import pytest
+
+
+def gradient(mode):
+    im = Image.linear_gradient("L")
+    if mode == "L":
+        return im
+    return Image.merge(
+        "RGB", (im, im.transpose(Image.Transpose.ROTATE_90), Image.radial_gradient("L"))
+    )
+
+
+def same(a, b):
+    return (a.mode, a.size) == (b.mode, b.size) and not ImageChops.difference(
+        a, b
+    ).getbbox()
+
+
+@pytest.mark.parametrize("backend", ["pillow", "numpy"])
+@pytest.mark.parametrize("factor", [0.5, 0.7, 1.5, 2.5])
+def test_scale_matches_point(backend, factor):
+    im = gradient("L")
+    expected = im.point(lambda i: i * factor)
+    assert same(PointProgram(X * factor, "L").apply(im, backend), expected)
+
+
+@pytest.mark.parametrize("backend", ["pillow", "numpy"])
+def test_then_matches_two_point_passes(backend):
+    im = gradient("RGB")
+    expected = im.point(lambda i: i * 1.5).point(lambda i: i * 0.5 + 3)
+    program = PointProgram(X * 1.5).then(X * 0.5 + 3)
+    assert same(program.apply(im, backend), expected)
+
+
+@pytest.mark.parametrize("backend", ["pillow", "numpy"])
+def test_masked_band_matches_tutorial(backend):
+    # The demo's Example #23, done the tutorial's way.
+    im = gradient("RGB")
+    source = im.split()
+    mask = source[0].point(lambda i: i < 100 and 255)
+    out = source[1].point(lambda i: i * 0.7)
+    source[1].paste(out, None, mask)
+    expected = Image.merge("RGB", source)
+
+    program = PointProgram({"G": where(R < 100, G * 0.7, G)})
+    assert program.passes() == ["lut", "where", "lut"]
+    assert same(program.apply(im, backend), expected)
+
+
+def test_general_expression_rounds_like_point():
+    im = gradient("RGB")
+    program = PointProgram({"R": (R + G + B) / 2})
+    assert program.passes()[0] == "general"
+    expected = [min(max(round((r + g + b) / 2), 0), 255) for r, g, b in im.getdata()]
+    assert list(program.apply(im).getdata(0)) == expected
@@ -0,0 +1,45 @@
+from PIL import Image, PdfParser
+from concurrent.futures import ThreadPoolExecutor
+from printdoc import prepare_page, write_document
+import pytest
+
+
+@pytest.fixture
+def pages(tmp_path):
+    paths = []
+    for i, size in enumerate([(3000, 2000), (640, 480), (200, 900)]):
+        path = tmp_path / f"page{i}.jpg"
+        Image.linear_gradient("L").resize(size).convert("RGB").save(path)
+        paths.append((str(path), f"Page {i} (test)"))
+    return paths
+
+
+def test_pages_are_downsampled_to_dpi(pages):
+    prepared = prepare_page(pages[0][0], "x", dpi=72)
+    # A4 less margins and the caption line, at 1 pixel per point.
+    assert prepared.pixel_size[0] <= 595 - 2 * 36
+    assert prepared.pixel_size[1] <= 842 - 2 * 36
+
+
+@pytest.mark.parametrize("workers", [1, None])
+def test_pdf_has_every_page(tmp_path, pages, workers):
+    dest = str(tmp_path / "out.pdf")
+    with ThreadPoolExecutor() as executor:
+        summary = write_document(
+            dest, iter(pages * 5), title="test", workers=workers, executor=executor
+        )
+    assert summary["pages"] == 15
+    pdf = PdfParser.PdfParser(dest)
+    assert len(pdf.pages) == 15
+    assert pdf.info[b"Title"] == b"test"
+
+
+def test_ps_has_every_page(tmp_path, pages):
+    dest = str(tmp_path / "out.ps")
+    summary = write_document(dest, pages, workers=1)
+    assert summary["format"] == "PS"
+    with open(dest, "rb") as f:
+        data = f.read()
+    assert data.count(b"%%Page: ") == 3
+    assert data.count(b"showpage") == 3
+    assert data.endswith(b"%%Pages: 3\n%%EOF\n")
@@ -0,0 +1,44 @@
+from PIL import Image
+from quantize import PaletteMapper, build_palette, recolor, remap_indices
+
+
+def colors(im):
+    return sorted(color for _, color in im.convert("RGB").getcolors())
+
+
+def test_palette_only_has_sample_colors():
+    samples = [Image.new("RGB", (64, 64), "red"), Image.new("RGB", (16, 16), "blue")]
+    palette = build_palette(samples)
+    assert colors(palette) == [(0, 0, 255), (255, 0, 0)]
+    assert sorted(palette.convert("RGB").getcolors()) == [
+        (256, (0, 0, 255)),
+        (4096, (255, 0, 0)),
+    ]
+
+
+def test_mapper_uses_the_shared_palette():
+    samples = [Image.new("RGB", (8, 8), c) for c in ("red", "lime", "blue")]
+    mapper = PaletteMapper.from_images(samples)
+    im = Image.new("RGB", (4, 4), (250, 10, 10))
+    im.paste((5, 5, 240), (0, 0, 2, 4))
+    out = mapper.quantize(im)
+    assert out.mode == "P"
+    assert out.getpalette() == mapper.palette
+    assert colors(out) == [(0, 0, 255), (255, 0, 0)]
+
+
+def test_mapper_drops_rgb_transparency():
+    im = Image.new("RGB", (4, 4), "red")
+    im.info["transparency"] = (0, 0, 0)
+    out = PaletteMapper.from_images([im]).quantize(im)
+    assert "transparency" not in out.info
+
+
+def test_recolor_and_remap_indices():
+    im = Image.new("P", (2, 1))
+    im.putpalette([255, 0, 0, 0, 0, 255])
+    im.putpixel((1, 0), 1)
+    assert list(remap_indices(im, [1, 0]).getdata()) == [1, 0]
+    assert remap_indices(im, [1, 0]).getpalette()[:6] == im.getpalette()[:6]
+    blue_red = recolor(im, [0, 0, 255, 255, 0, 0])
+    assert list(blue_red.convert("RGB").getdata()) == [(0, 0, 255), (255, 0, 0)]
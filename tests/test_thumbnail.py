@@ -0,0 +1,23 @@
+from PIL import Image
+from thumbnail import fit_size, make_thumbnails
+from unittest import mock
+import pytest
+
+
+@pytest.mark.parametrize("source", ["img/slide12.jpg", "img/hopper.ppm"])
+def test_thumbnails_are_never_upscaled(source):
+    sizes = (1024, 256, 64, (100, 30))
+    resizes = []
+    resize = Image.Image.resize
+
+    def spy(self, size, *args, **kwargs):
+        resizes.append((self.size, tuple(size)))
+        return resize(self, size, *args, **kwargs)
+
+    with mock.patch.object(Image.Image, "resize", spy):
+        thumbs, report = make_thumbnails(source, sizes)
+    for size in sizes:
+        box = (size, size) if isinstance(size, int) else size
+        assert thumbs[size].size == fit_size(report.original_size, box)
+    for before, after in resizes:
+        assert before[0] >= after[0] and before[1] >= after[1]